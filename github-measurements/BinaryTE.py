@@ -0,0 +1,498 @@
+from __future__ import division
+import hashlib
+import numpy as np
+from scipy.special import betaincinv
+
+'''
+Transfer entropy of binary time series computed with NumPy.
+
+This is the estimator of JIDT's TransferEntropyCalculatorDiscrete(2,1,1,1,1,delay) used by the TE
+measurements: destination history length 1 and source history length 1, with the source value taken
+delay steps before the destination value that is predicted.  For a source series s and destination
+series d the observations are the triples
+
+    (d[t], d[t-1], s[t-delay])    for t = max(1, delay), ..., len(d) - 1
+
+and the TE (in bits) is the conditional mutual information between d[t] and s[t-delay] given d[t-1],
+computed from the counts of the 8 joint states.
+
+The TE of all (source, destination) pairs of a repo (repo group) is computed at once from the joint
+state counts of all pairs, which are matrix products of the stacked binary series.
+
+The binned series of the actors of a group are stored bit-packed (BinarySeries, 1 bit per bin) and
+are only unpacked while the TE of the group is computed.
+'''
+
+
+class BinarySeries(object):
+    """
+    Bit-packed binary time series of a set of actors
+
+    Row i of packed holds the bins of actor i in the bit order of np.packbits.  Indexing by an actor
+    returns its unpacked series, so a BinarySeries can be used like a dictionary of binned series.
+    """
+
+    def __init__(self, actors, rows, bins, totalBins):
+        """
+        Inputs:
+        actors - List of actor ids
+        rows - Array of the positions in actors of the actor of each event
+        bins - Array of the bin of each event.  Bins outside of [0, totalBins) are ignored.
+        totalBins - Length of the series
+        """
+
+        self.actors = list(actors)
+        self.totalBins = totalBins
+        self.positions = dict(zip(self.actors, range(len(self.actors))))
+
+        rows = np.asarray(rows, dtype=np.int64)
+        bins = np.asarray(bins, dtype=np.int64)
+        valid = (bins >= 0) & (bins < totalBins)
+        rows = rows[valid]
+        bins = bins[valid]
+
+        self.packed = np.zeros((len(self.actors), (totalBins + 7) // 8), dtype=np.uint8)
+        np.bitwise_or.at(self.packed, (rows, bins >> 3), (128 >> (bins & 7)).astype(np.uint8))
+
+    def bits(self):
+        """
+        Unpacked series of all actors as a uint8 array of shape (number of actors, totalBins)
+        """
+        return np.unpackbits(self.packed, axis=1)[:, :self.totalBins]
+
+    def __getitem__(self, actor):
+        return np.unpackbits(self.packed[self.positions[actor]])[:self.totalBins].astype(int)
+
+    def __contains__(self, actor):
+        return actor in self.positions
+
+    def __iter__(self):
+        return iter(self.actors)
+
+    def __len__(self):
+        return len(self.actors)
+
+    def keys(self):
+        return list(self.actors)
+
+    def items(self):
+        return [(actor, self[actor]) for actor in self.actors]
+
+
+def seriesMatrix(actorTS):
+    """
+    Stack the binned series of a BinarySeries or of a dictionary of series into one array (actors x bins)
+    """
+
+    if isinstance(actorTS, BinarySeries):
+        return actorTS.bits()
+
+    return np.array([actorTS[actor] for actor in actorTS.keys()])
+
+
+def jointStateCounts(src, dest, delay):
+    """
+    Counts of the joint (dest next, dest past, source) states of a pair of binary series
+
+    Inputs:
+    src, dest - Binary (0/1) arrays of equal length
+    delay - Source-destination delay in time steps (>= 1)
+
+    Outputs:
+    Array of shape (2, 2, 2) indexed by [dest next, dest past, source]
+    """
+
+    src = np.asarray(src, dtype=np.int64)
+    dest = np.asarray(dest, dtype=np.int64)
+
+    start = max(1, delay)
+    n = len(dest)
+    if n <= start:
+        return np.zeros((2, 2, 2), dtype=np.int64)
+
+    states = 4 * dest[start:] + 2 * dest[start - 1:n - 1] + src[start - delay:n - delay]
+
+    return np.bincount(states, minlength=8).reshape(2, 2, 2)
+
+
+def teFromCounts(counts):
+    """
+    Transfer entropy (bits) from joint state counts
+
+    Inputs:
+    counts - Array of shape (..., 2, 2, 2) indexed by [dest next, dest past, source] in the last three axes
+
+    Outputs:
+    Array of the TE values of shape counts.shape[:-3]
+    """
+
+    counts = np.asarray(counts, dtype=np.float64)
+
+    observations = counts.sum(axis=(-3, -2, -1))
+    nextPast = counts.sum(axis=-1, keepdims=True)
+    sourcePast = counts.sum(axis=-3, keepdims=True)
+    past = counts.sum(axis=(-3, -1), keepdims=True)
+
+    #p(next|past,source) / p(next|past) = c(next,past,source) * c(past) / (c(past,source) * c(next,past))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        local = np.log2(counts * past / (sourcePast * nextPast))
+        terms = np.where(counts > 0, counts * local, 0.0)
+        te = terms.sum(axis=(-3, -2, -1)) / observations
+
+    return np.where(observations > 0, te, 0.0)
+
+
+def binaryTE(src, dest, delay):
+    """
+    Transfer entropy (bits) from a binary source series to a binary destination series
+    """
+
+    return teFromCounts(jointStateCounts(src, dest, delay))[()]
+
+
+def binaryTESignificance(src, dest, delay, nReps, rng=None):
+    """
+    Permutation test of the transfer entropy of a pair of binary series
+
+    As in JIDT's computeSignificance, surrogates are generated by randomly reordering the source values
+    across the observations, keeping the destination next and past values in place.
+
+    Inputs:
+    src, dest - Binary (0/1) arrays of equal length
+    delay - Source-destination delay in time steps
+    nReps - Number of surrogates
+    rng - (Optional) np.random.RandomState used to draw the permutations
+
+    Outputs:
+    te - Observed TE
+    nullMean, nullStd - Mean and (sample) standard deviation of the TE of the surrogates
+    """
+
+    if rng is None:
+        rng = np.random.RandomState()
+
+    src = np.asarray(src, dtype=np.int64)
+    dest = np.asarray(dest, dtype=np.int64)
+
+    start = max(1, delay)
+    n = len(dest)
+    destStates = 4 * dest[start:] + 2 * dest[start - 1:n - 1]
+    source = src[start - delay:n - delay]
+
+    te = teFromCounts(np.bincount(destStates + source, minlength=8).reshape(2, 2, 2))[()]
+
+    #one permutation of the source values per row
+    permutations = np.argsort(rng.random_sample((nReps, len(source))), axis=1)
+    states = destStates[np.newaxis, :] + source[permutations]
+    offsets = 8 * np.arange(nReps)[:, np.newaxis]
+    counts = np.bincount((states + offsets).ravel(), minlength=8 * nReps).reshape(nReps, 2, 2, 2)
+    null = teFromCounts(counts)
+
+    return te, null.mean(), null.std(ddof=1)
+
+
+def allPairsStateCounts(src, dest, delay):
+    """
+    Joint state counts of every (source, destination) pair of two sets of binary series
+
+    The counts with source value 1 of all pairs are matrix products of the (delay-shifted) source
+    series with the indicators of the 4 (dest next, dest past) states of the destination series.
+
+    Inputs:
+    src - Binary array of shape (number of sources, number of time steps)
+    dest - Binary array of shape (number of destinations, number of time steps)
+    delay - Source-destination delay in time steps (>= 1)
+
+    Outputs:
+    Array of shape (number of sources, number of destinations, 2, 2, 2) indexed by
+    [source, destination, dest next, dest past, source value]
+    """
+
+    #products and sums of 0/1 values are exact in float32 for series shorter than 2**24 bins
+    src = np.asarray(src, dtype=np.float32)
+    dest = np.asarray(dest, dtype=np.float32)
+
+    nSrc, n = src.shape
+    nDest = dest.shape[0]
+    start = max(1, delay)
+
+    counts = np.zeros((nSrc, nDest, 2, 2, 2), dtype=np.int64)
+    if n <= start:
+        return counts
+
+    source = src[:, start - delay:n - delay]
+    nextVal = dest[:, start:]
+    pastVal = dest[:, start - 1:n - 1]
+
+    for nv in (0, 1):
+        for pv in (0, 1):
+            state = (nextVal if nv else 1 - nextVal) * (pastVal if pv else 1 - pastVal)
+            active = np.dot(source, state.T).round().astype(np.int64)
+            counts[:, :, nv, pv, 1] = active
+            counts[:, :, nv, pv, 0] = state.sum(axis=1).round().astype(np.int64)[np.newaxis, :] - active
+
+    return counts
+
+
+def allPairsTE(src, dest, delays):
+    """
+    Transfer entropy (bits) of every (source, destination) pair at each delay
+
+    Inputs:
+    src - Binary array of shape (number of sources, number of time steps)
+    dest - Binary array of shape (number of destinations, number of time steps)
+    delays - List of delays
+
+    Outputs:
+    Array of shape (number of sources, number of destinations, number of delays)
+    """
+
+    te = np.zeros((len(src), len(dest), len(delays)))
+    for k, delay in enumerate(delays):
+        te[:, :, k] = teFromCounts(allPairsStateCounts(src, dest, delay))
+
+    return te
+
+
+def surrogateTE(counts, nReps, rng):
+    """
+    TE of the surrogates of the permutation test of many pairs at once
+
+    Reordering the source values across the observations keeps the number of observations in each
+    (dest next, dest past) state and the number of source values equal to 1.  The number of source ones
+    falling into each of the 4 states is then multivariate hypergeometric, so the joint state counts of
+    the surrogates are drawn directly instead of permuting the series.
+
+    Inputs:
+    counts - Array of shape (number of pairs, 2, 2, 2) of the observed joint state counts
+    nReps - Number of surrogates per pair
+    rng - np.random.RandomState used to draw the surrogates
+
+    Outputs:
+    Array of shape (number of pairs, nReps) of the TE of the surrogates
+    """
+
+    counts = np.asarray(counts, dtype=np.int64)
+    nPairs = len(counts)
+
+    states = counts.sum(axis=-1).reshape(nPairs, 4)
+    onesLeft = np.repeat(counts[..., 1].sum(axis=(-2, -1)), nReps)
+    left = np.repeat(states.sum(axis=1), nReps)
+
+    ones = np.zeros((nPairs * nReps, 4), dtype=np.int64)
+    for state in range(3):
+        good = np.repeat(states[:, state], nReps)
+        left = left - good
+        draw = onesLeft > 0
+        if draw.any():
+            ones[draw, state] = rng.hypergeometric(good[draw], left[draw], onesLeft[draw])
+        onesLeft = onesLeft - ones[:, state]
+    ones[:, 3] = onesLeft
+
+    surrogates = np.zeros((nPairs, nReps, 2, 2, 2), dtype=np.int64)
+    surrogates[..., 1] = ones.reshape(nPairs, nReps, 2, 2)
+    surrogates[..., 0] = states.reshape(nPairs, 1, 2, 2) - surrogates[..., 1]
+
+    return teFromCounts(surrogates)
+
+
+def teZScores(counts, nReps, rng, chunkSize=1000):
+    """
+    Z-scores of the observed TE of many pairs against their permutation null distributions
+
+    The surrogates take memory proportional to the number of pairs times nReps, so they are drawn
+    for chunkSize pairs at a time.
+
+    Inputs:
+    counts - Array of shape (number of pairs, 2, 2, 2) of the observed joint state counts
+    nReps - Number of surrogates per pair
+    rng - np.random.RandomState used to draw the surrogates
+    chunkSize - Number of pairs whose surrogates are drawn at once
+
+    Outputs:
+    Array of the z-scores (observed TE - null mean) / null standard deviation of each pair
+    """
+
+    te = teFromCounts(counts)
+    z_scores = np.zeros(len(te))
+
+    for start in range(0, len(te), chunkSize):
+        chunk = slice(start, start + chunkSize)
+        null = surrogateTE(counts[chunk], nReps, rng)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z_scores[chunk] = (te[chunk] - null.mean(axis=1)) / null.std(axis=1, ddof=1)
+
+    return z_scores
+
+
+def teZScoresSequential(counts, nReps, rng, zThresh=3.0, batchSize=30, alpha=0.001, chunkSize=1000):
+    """
+    Z-scores of the observed TE of many pairs, drawing surrogates only until a pair is settled as not significant
+
+    Surrogates are drawn in batches and the number of surrogates whose TE is at least the observed TE is counted.
+    For any null distribution P(null >= mean + zThresh * std) <= 1 / (1 + zThresh ** 2) (Cantelli's inequality),
+    so a pair whose probability of such surrogates is larger cannot reach zThresh.  A pair stops when the one-sided
+    Clopper-Pearson lower bound (at level alpha) of that probability exceeds 1 / (1 + zThresh ** 2).  The inequality
+    also holds for the surrogates drawn, so the z-score of a stopped pair is below zThresh.  The bound does not
+    assume a normal null distribution.  Pairs which may be significant always use nReps surrogates as in teZScores.
+
+    Inputs:
+    counts - Array of shape (number of pairs, 2, 2, 2) of the observed joint state counts
+    nReps - Maximum number of surrogates per pair
+    rng - np.random.RandomState used to draw the surrogates
+    zThresh - Z-score of the significance decision
+    batchSize - Number of surrogates drawn at a time (and the minimum number per pair)
+    alpha - Level of the lower confidence bound checked after each batch
+    chunkSize - Number of pairs whose surrogates are drawn at once
+
+    Outputs:
+    z_scores - Array of the z-scores of each pair from the surrogates it used
+    used - Array of the number of surrogates used for each pair
+    """
+
+    te = teFromCounts(counts)
+    nPairs = len(te)
+
+    total = np.zeros(nPairs)
+    totalSq = np.zeros(nPairs)
+    exceed = np.zeros(nPairs, dtype=np.int64)
+    used = np.zeros(nPairs, dtype=np.int64)
+    active = np.arange(nPairs)
+
+    while len(active) > 0:
+        nDraw = min(batchSize, nReps - used[active[0]])
+        for start in range(0, len(active), chunkSize):
+            pairs = active[start:start + chunkSize]
+            null = surrogateTE(counts[pairs], nDraw, rng)
+            total[pairs] += null.sum(axis=1)
+            totalSq[pairs] += (null ** 2).sum(axis=1)
+            exceed[pairs] += (null >= te[pairs, np.newaxis]).sum(axis=1)
+        used[active] += nDraw
+
+        if used[active[0]] >= nReps:
+            break
+
+        k = exceed[active]
+        n = used[active]
+        with np.errstate(invalid='ignore'):
+            lower = np.where(k > 0, betaincinv(k, n - k + 1, alpha), 0.0)
+        settled = lower > 1.0 / (1.0 + zThresh ** 2)
+        active = active[~settled]
+
+    mean = total / np.maximum(used, 1)
+    std = np.sqrt(np.maximum(totalSq - used * mean ** 2, 0.0) / np.maximum(used - 1, 1))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (te - mean) / std, used
+
+
+def binaryEntropy(p):
+    """
+    Entropy (bits) of binary variables with probabilities p of the value 1
+    """
+
+    p = np.asarray(p, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        h = -p * np.log2(p) - (1 - p) * np.log2(1 - p)
+
+    return np.where((p > 0) & (p < 1), h, 0.0)
+
+
+def teUpperBounds(src, dest, delays):
+    """
+    Upper bounds of the TE of pairs computed from each series alone
+
+    The TE is a conditional mutual information I(dest next; source | dest past), so it is at most the
+    entropy of the source values H(source) and at most H(dest next | dest past), both over the observations
+    of the delay.  A pair whose smaller bound is below the TE threshold at every delay cannot pass it.
+
+    Inputs:
+    src - Binary array of shape (number of sources, number of time steps)
+    dest - Binary array of shape (number of destinations, number of time steps)
+    delays - List of delays
+
+    Outputs:
+    srcBounds - Array (sources x delays) of H(source)
+    destBounds - Array (destinations x delays) of H(dest next | dest past)
+    """
+
+    n = src.shape[1]
+    srcBounds = np.zeros((len(src), len(delays)))
+    destBounds = np.zeros((len(dest), len(delays)))
+
+    for k, delay in enumerate(delays):
+        start = max(1, delay)
+        observations = n - start
+        if observations <= 0:
+            continue
+
+        srcBounds[:, k] = binaryEntropy(src[:, start - delay:n - delay].sum(axis=1, dtype=np.int64) / observations)
+
+        nextVal = dest[:, start:].astype(bool)
+        pastVal = dest[:, start - 1:n - 1].astype(bool)
+        past = pastVal.sum(axis=1, dtype=np.int64)
+        nextPast = (nextVal & pastVal).sum(axis=1, dtype=np.int64)
+        nextNoPast = (nextVal & ~pastVal).sum(axis=1, dtype=np.int64)
+
+        #H(next | past) = sum over past values of p(past) H(next | past)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            destBounds[:, k] = (past * binaryEntropy(np.where(past > 0, nextPast / past, 0.0)) +
+                                (observations - past) * binaryEntropy(np.where(observations > past, nextNoPast / (observations - past), 0.0))) / observations
+
+    return srcBounds, destBounds
+
+
+def topK(values, k):
+    """
+    Positions of the k largest values, without sorting all of them
+
+    The positions are in the order of sorted(..., reverse=True) on the values: descending values, with equal
+    values in ascending position order.
+
+    Inputs:
+    values - 1-d array
+    k - Number of positions to select
+
+    Outputs:
+    Array of at most k positions
+    """
+
+    values = np.asarray(values)
+
+    if len(values) > k:
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        kth = np.partition(values, len(values) - k)[len(values) - k]
+        above = np.flatnonzero(values > kth)
+        ties = np.flatnonzero(values == kth)[:k - len(above)]
+        positions = np.concatenate([above, ties])
+    else:
+        positions = np.arange(len(values))
+
+    return positions[np.lexsort((positions, -values[positions]))]
+
+
+def groupSeed(seed, group):
+    """
+    Seed of the surrogates of a repo (repo group), derived from the TE seed and the group
+
+    Every group gets its own random stream, which does not depend on the order (or the worker) in which
+    the groups are processed.  The seed comes from a hash of the seed and the group name, which,
+    unlike hash(), is the same in every process.
+    """
+
+    digest = hashlib.md5('{}:{}'.format(seed, group).encode('utf-8')).hexdigest()
+
+    return int(digest[:8], 16)
+
+
+def pairSeed(seed, src, dest, delay):
+    """
+    Seed of the surrogates of the significance test of a single (source, destination) pair, derived from the
+    TE seed, the content of both series and the delay, so that the test is reproducible and pairs do not share
+    their surrogates
+    """
+
+    digests = [hashlib.md5(np.ascontiguousarray(series, dtype=np.int8).tobytes()).hexdigest() for series in (src, dest)]
+
+    return groupSeed(seed, (digests[0], digests[1], delay))
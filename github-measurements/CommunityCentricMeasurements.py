@@ -6,6 +6,7 @@ from functools import partial
 from pathos import pools as pp
 import pickle as pkl
 import warnings
+from GroupIndex import MembershipIndex
 
 '''
 This class implements community centric method. Each function will describe which metric it is used for according
@@ -37,14 +38,16 @@ class CommunityCentricMeasurements():
             self.comDic = pkl.load(handle)
 
     '''
-    This method subsets the full data frame based on community membership of repos or users.
+    This method indexes the full data frame based on community membership of repos or users.
+    The events of each community are located with a sparse repo/user to community membership matrix
+    (see GroupIndex.py), so that overlapping communities do not store copies of the same events.
     Inputs: path - file path to pickle file containing community lists
-    Outputs: A dictionary containing a data frame for each community
+    Outputs: A dictionary-like index containing a data frame for each community
     '''
     def getCommunities(self,path='data/communities.pkl'):
         self.loadMetaData() 
         self.loadCommunities(path)
-        comValuesDic = {}
+        groups = []
         repoOrent = ['languages','topics']
         userOrent = ['location','companies']
         
@@ -52,17 +55,15 @@ class CommunityCentricMeasurements():
         for community in repoOrent:
             if community in self.comDic.keys():
                  for key in self.comDic[community]:
-                    d = self.main_df[self.main_df['repo'].isin(self.comDic[community][key])]
-                    comValuesDic[key] = d
+                    groups.append((key, 'repo', self.encode('repo', self.comDic[community][key])))
 
         #user-focused communities
         for community in userOrent:
             if community in self.comDic.keys():
                  for key in self.comDic[community]:
-                    d = self.main_df[self.main_df['user'].isin(self.comDic[community][key])]
-                    comValuesDic[key] = d
+                    groups.append((key, 'user', self.encode('user', self.comDic[community][key])))
                     
-        return comValuesDic
+        return MembershipIndex(self.main_df, groups, missing=-1 if self.vocab is not None else None)
 
     '''
     A function to calculate a specified measurement on each community.
@@ -100,7 +101,7 @@ class CommunityCentricMeasurements():
     def getProportionHelper(self,df,eventType):
 
         if eventType != None:
-            df = df[df['event'].isin(eventType)]
+            df = df[df['event'].isin(self.encode('event', eventType))]
 
         p = df[['user','event']].groupby('event').count()
         p = p.reset_index()
@@ -108,7 +109,7 @@ class CommunityCentricMeasurements():
 
         p['value'] = p['value']/p.value.values.sum()
 
-        return p
+        return self.decodeResult(p)
 
     '''
     A wrapper function to calculate the proportion of users who interact with a community who are active contributors.
@@ -132,7 +133,7 @@ class CommunityCentricMeasurements():
 
         #total number of unique users
         totalUsers = df['user'].nunique()
-        df = df[df['event'].isin(self.contribution_events)]
+        df = df[df['event'].isin(self.encode('event', self.contribution_events))]
 
         #number of unique users with direct contributions
         contribUsers = df['user'].nunique()
@@ -169,7 +170,7 @@ class CommunityCentricMeasurements():
     def getNumUserActionsHelper(self,df,unit,eventType):
         
         if eventType != None:
-            df = df[df.event.isin(eventType)]
+            df = df[df.event.isin(self.encode('event', eventType))]
         
         df['value'] = [0 for i in range(len(df))]
         df = df.set_index('time')
@@ -206,7 +207,7 @@ class CommunityCentricMeasurements():
     def burstsInCommunityEventsHelper(self, df,eventType):
 
         if eventType != None:
-            df = df[df['event'].isin(eventType)]
+            df = df[df['event'].isin(self.encode('event', eventType))]
 
         #get interevent times
         df['diff'] = df['time'].diff()
@@ -247,7 +248,7 @@ class CommunityCentricMeasurements():
 
         if self.main_df_opt is not None:            
 
-            df = df[df['event'] == 'IssuesEvent']
+            df = df[df['event'] == self.encode('event', 'IssuesEvent')]
 
             #round times down to nearest unit
             df = df.assign(time=df.time.dt.floor(unit))
@@ -295,7 +296,7 @@ class CommunityCentricMeasurements():
     def ageOfAccountsHelper(self,df,eventType):
         if self.useUserMetaData:
             if eventType != None:
-                df  = df[df.event.isin(eventType)]
+                df  = df[df.event.isin(self.encode('event', eventType))]
 
             df = df.merge(self.created_at_df, left_on='user', right_on='user', how='inner')
             df = df.sort_values(['time'])
@@ -332,7 +333,7 @@ class CommunityCentricMeasurements():
     def userGeoLocationHelper(self,df,eventType):
 
         if not eventType is None:
-            df = df[df.event.isin(eventType)]
+            df = df[df.event.isin(self.encode('event', eventType))]
 
         if self.useUserMetaData:
 
@@ -378,7 +379,7 @@ class CommunityCentricMeasurements():
     def getUserBurstByCommunityHelper(self,df,eventType,thresh):
         
         if eventType != None:
-            df = df[df.event.isin(eventType)]
+            df = df[df.event.isin(self.encode('event', eventType))]
 
         #only calculate burstiness for users which have sufficient activity
         users = df.groupby('user')
@@ -0,0 +1,229 @@
+import os
+import argparse
+import pandas as pd
+import numpy as np
+
+'''
+Columnar on-disk event store used as a fast alternative to the csv input of Measurements.
+
+A store is a directory of NumPy arrays that can be memory-mapped without any parsing:
+    time.npy                 - int64 epoch seconds, sorted ascending
+    event.npy, user.npy,
+    repo.npy                 - int32 codes into the matching vocabulary (-1 for missing values)
+    event_vocab.npy, ...     - unicode arrays holding the distinct values of each encoded column
+    action.npy, merged.npy   - optional columns of the 6-column format (int32 action codes and
+                               int8 merged flags with -1 for missing values)
+
+A store can be created from the 4- or 6-column event csv files with:
+    python EventStore.py -i events.csv -o events_store
+'''
+
+id_columns = ['event','user','repo']
+
+
+class Vocabulary(object):
+    """
+    Dictionary mapping the string values of the encoded columns to integer codes.
+    Codes are positions in the vocabulary of each column and new values are appended,
+    so codes handed out earlier stay valid when the vocabulary grows.
+    """
+
+    def __init__(self):
+        self.index = {}
+
+    def values(self, column):
+        """
+        Distinct values of a column in code order
+        """
+        return self.index.get(column, pd.Index([], dtype=object))
+
+    def update(self, column, values):
+        """
+        Encode values, adding unseen values to the vocabulary
+
+        Inputs:
+        column - Name of the encoded column
+        values - Array-like of values to encode
+
+        Outputs:
+        int32 array of codes (-1 for missing values)
+        """
+
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+
+        index = self.values(column)
+        known = index.get_indexer(uniques)
+        new = known == -1
+        if new.any():
+            known[new] = np.arange(len(index), len(index) + new.sum())
+            self.index[column] = index.append(pd.Index(uniques[new], dtype=object))
+
+        known = np.append(known, -1).astype(np.int32)
+
+        return known[codes]
+
+    def encode(self, column, values):
+        """
+        Encode values without changing the vocabulary
+
+        Inputs:
+        column - Name of the encoded column
+        values - Array-like of values to encode
+
+        Outputs:
+        int32 array of codes (-1 for values which are not in the vocabulary)
+        """
+
+        return self.values(column).get_indexer(np.asarray(values, dtype=object)).astype(np.int32)
+
+    def decode(self, column, codes):
+        """
+        Map codes back to the original values
+
+        Inputs:
+        column - Name of the encoded column
+        codes - Array-like of codes
+
+        Outputs:
+        Object array of values (NaN for code -1)
+        """
+
+        values = np.append(self.values(column).values, np.nan).astype(object)
+
+        return values[np.asarray(codes)]
+
+
+def isEventStore(path):
+    """
+    Check whether a path points to an event store directory
+    """
+
+    try:
+        return os.path.isfile(os.path.join(path, 'time.npy'))
+    except (TypeError, AttributeError):
+        return False
+
+
+def preprocessEvents(df):
+    """
+    Rename the columns of a raw 4- or 6-column event data frame, convert the times and sort by time.
+    The sort is stable so that events with equal times keep their order from the input file.
+    """
+
+    if df.columns[0] == '_id':
+        del df['_id']
+    if len(df.columns) == 4:
+        df.columns = ['time', 'event', 'user', 'repo']
+    else:
+        df.columns = ['time', 'event', 'user', 'repo','action','merged']
+    df['time'] = pd.to_datetime(df['time'])
+    df = df.sort_values(by='time', kind='mergesort')
+    return df
+
+
+def writeEventStore(df, path):
+    """
+    Write a preprocessed event data frame to an event store directory
+
+    Inputs:
+    df - Data frame with the columns time, event, user, repo and optionally action, merged
+    path - Output directory
+    """
+
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    times = pd.to_datetime(df['time']).values.astype('datetime64[s]').astype(np.int64)
+    order = np.argsort(times, kind='mergesort')
+
+    np.save(os.path.join(path, 'time.npy'), times[order])
+
+    vocab = Vocabulary()
+    for col in id_columns:
+        codes = vocab.update(col, df[col].values)
+        np.save(os.path.join(path, col + '.npy'), codes[order])
+        np.save(os.path.join(path, col + '_vocab.npy'), np.asarray(vocab.values(col), dtype=object).astype(np.str_))
+
+    if 'action' in df.columns:
+        codes = vocab.update('action', df['action'].values)
+        np.save(os.path.join(path, 'action.npy'), codes[order])
+        np.save(os.path.join(path, 'action_vocab.npy'), np.asarray(vocab.values('action'), dtype=object).astype(np.str_))
+
+        merged = df['merged'].values
+        flags = np.full(len(merged), -1, dtype=np.int8)
+        notnull = pd.notnull(merged)
+        flags[notnull] = merged[notnull].astype(bool)
+        np.save(os.path.join(path, 'merged.npy'), flags[order])
+
+
+def readEventStore(path, mmap=True, vocabulary=None):
+    """
+    Open an event store directory as an event data frame
+
+    Inputs:
+    path - Event store directory
+    mmap - Whether to memory-map the arrays instead of reading them into memory
+    vocabulary - Vocabulary object.  If given, the event, user and repo columns are returned as codes of
+                 this vocabulary (which is extended with the values of the store) instead of strings.
+
+    Outputs:
+    Data frame with the same columns and time ordering produced by Measurements.preprocess
+    """
+
+    mode = 'r' if mmap else None
+
+    def load(name):
+        return np.load(os.path.join(path, name + '.npy'), mmap_mode=mode)
+
+    vocab = Vocabulary()
+    for col in id_columns + ['action']:
+        if os.path.isfile(os.path.join(path, col + '_vocab.npy')):
+            vocab.index[col] = pd.Index(np.load(os.path.join(path, col + '_vocab.npy')).astype(object))
+
+    columns = {'time': load('time').astype('datetime64[s]').astype('datetime64[ns]')}
+    for col in id_columns:
+        if vocabulary is None:
+            columns[col] = vocab.decode(col, load(col))
+        else:
+            #translate the codes of the store to the codes of the given vocabulary
+            codes = np.append(vocabulary.update(col, vocab.values(col)), -1).astype(np.int32)
+            columns[col] = codes[load(col)]
+
+    names = ['time'] + id_columns
+    if os.path.isfile(os.path.join(path, 'action.npy')):
+        columns['action'] = vocab.decode('action', load('action'))
+
+        flags = load('merged')
+        if (flags < 0).any():
+            merged = np.where(flags == 1, True, False).astype(object)
+            merged[flags < 0] = np.nan
+        else:
+            merged = flags == 1
+        columns['merged'] = merged
+
+        names = names + ['action','merged']
+
+    return pd.DataFrame(columns, columns=names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a 4- or 6-column event csv file into an event store directory')
+    parser.add_argument('-i', '--input_csv', dest='csv', required=True,
+                        help='path to the .csv file containing the events')
+    parser.add_argument('-o', '--output_dir', dest='output_dir', required=True,
+                        help='path to the event store directory to create')
+    parser.add_argument('--no_header', dest='header', action='store_false',
+                        help='the .csv file has no header row')
+
+    args = parser.parse_args()
+
+    if args.header:
+        df = pd.read_csv(args.csv)
+    else:
+        df = pd.read_csv(args.csv, header=None)
+
+    writeEventStore(preprocessEvents(df), args.output_dir)
+
+
+if __name__ == "__main__":
+    main()
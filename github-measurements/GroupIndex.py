@@ -0,0 +1,323 @@
+import pandas as pd
+import numpy as np
+from scipy import sparse
+
+'''
+Group indexes over the rows of an event data frame.
+
+The rows belonging to the selected groups (e.g. the interested repos of the node-level measurements)
+are gathered once into a frame sorted by group, keeping the time order of the events within each group,
+together with the offsets of each group in that frame.  The data of a group is then a slice of this
+frame instead of a boolean scan and copy of the full data set.
+
+Overlapping groups (e.g. communities of repos or users) are indexed with a sparse membership matrix
+mapping ids to groups, from which the positions of the events of every group are computed at once.
+
+The event times of the actors of several groups (e.g. for the TE measurements) are split in one sort
+into a CSR layout: the times of all series in one array and the offsets of each series in it.
+
+Per-group reductions of the event times (e.g. the average time between events) are computed for all
+groups in one groupby instead of applying a Python function to each group.
+'''
+
+
+class GroupIndex(object):
+    """
+    Mapping from group labels to the events of each group
+
+    The data frames returned for the groups share their data with the index.  Measurement helpers may
+    add columns to them, but should not overwrite existing columns in place.
+    """
+
+    def __init__(self, df, column, keys, labels=None, missing=None):
+        """
+        Inputs:
+        df - Events data frame
+        column - Name of the column holding the group values (e.g. repo)
+        keys - Values of column for each group to index
+        labels - Labels of the groups used as the mapping keys (defaults to keys)
+        missing - (Optional) Key value of groups which do not occur in the data, e.g. the code -1 of ids
+                  missing from a vocabulary.  These groups and groups with null keys are empty.
+        """
+
+        if labels is None:
+            labels = keys
+
+        #drop repeated groups, keeping the first occurrence of each label
+        keys = pd.Index(list(keys), dtype=object)
+        first = ~pd.Index(list(labels), dtype=object).duplicated()
+        keys = keys[first]
+        self.labels = [label for label, keep in zip(labels, first) if keep]
+
+        #only the groups with a key present in the data are matched against the events
+        present = ~pd.isnull(keys)
+        if missing is not None:
+            present &= keys != missing
+        present = np.flatnonzero(present)
+
+        codes = pd.Index(keys[present].tolist()).get_indexer(df[column].values)
+        rows = np.flatnonzero(codes >= 0)
+        codes = present[codes[rows]]
+
+        #a stable sort keeps the original (time) order of the events within each group
+        order = np.argsort(codes, kind='mergesort')
+        self.frame = df.iloc[rows[order]]
+
+        counts = np.bincount(codes, minlength=len(keys))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.positions = dict(zip(self.labels, range(len(self.labels))))
+
+    def __getitem__(self, label):
+        i = self.positions[label]
+        return pd.DataFrame(self.frame.iloc[self.offsets[i]:self.offsets[i + 1]])
+
+    def __contains__(self, label):
+        return label in self.positions
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def keys(self):
+        return list(self.labels)
+
+    def items(self):
+        return [(label, self[label]) for label in self.labels]
+
+    def sizes(self):
+        """
+        Number of events of each group
+        """
+        return dict(zip(self.labels, np.diff(self.offsets)))
+
+
+class MembershipIndex(object):
+    """
+    Mapping from group labels to the events of groups defined by lists of member ids (e.g. communities)
+
+    Groups may overlap.  Only the row positions of each group's events are stored; the data frame of a
+    group is taken from the events data frame when it is requested.
+    """
+
+    def __init__(self, df, groups, missing=None):
+        """
+        Inputs:
+        df - Events data frame
+        groups - List of (label, column, members) tuples, where column is the name of the column holding
+                 the member ids (e.g. repo or user) and members is the list of ids of the group.
+                 For repeated labels the last group is used.
+        missing - (Optional) Member id of members which do not occur in the data, e.g. the code -1 of ids
+                  missing from a vocabulary.  These members and null members match no events.
+        """
+
+        self.df = df
+        self.missing = missing
+
+        members = {}
+        for label, column, ids in groups:
+            members[label] = (column, ids)
+        self.labels = list(members.keys())
+
+        self.rows = {}
+        self.membership = {}
+        for column in pd.unique(np.array([column for column, ids in members.values()], dtype=object)):
+            labels = [label for label in self.labels if members[label][0] == column]
+            self.indexColumn(column, labels, [members[label][1] for label in labels])
+
+    def indexColumn(self, column, labels, members):
+        """
+        Compute the event positions of the groups defined on one column
+        """
+
+        members = [[member for member in m if not pd.isnull(member) and not (self.missing is not None and member == self.missing)]
+                   for m in members]
+        ids = pd.Index(pd.unique(np.concatenate([np.asarray(m, dtype=object) for m in members] + [[]])))
+
+        #sparse membership matrix: member ids x groups
+        member_pos = np.concatenate([ids.get_indexer(np.asarray(m, dtype=object)) for m in members] + [[]]).astype(np.int64)
+        group_pos = np.repeat(np.arange(len(members)), [len(m) for m in members])
+        self.membership[column] = sparse.csr_matrix((np.ones(len(member_pos), dtype=np.int8), (member_pos, group_pos)),
+                                                    shape=(len(ids), len(members)))
+
+        codes = ids.get_indexer(self.df[column].values)
+        rows = np.flatnonzero(codes >= 0)
+
+        #groups x events matrix whose rows hold the (ascending) positions of the events of each group
+        events = self.membership[column][codes[rows]].T.tocsr()
+        events.sort_indices()
+
+        for j, label in enumerate(labels):
+            self.rows[label] = rows[events.indices[events.indptr[j]:events.indptr[j + 1]]]
+
+    def __getitem__(self, label):
+        return self.df.iloc[self.rows[label]]
+
+    def __contains__(self, label):
+        return label in self.rows
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def keys(self):
+        return list(self.labels)
+
+    def items(self):
+        return [(label, self[label]) for label in self.labels]
+
+    def sizes(self):
+        """
+        Number of events of each group
+        """
+        return dict((label, len(self.rows[label])) for label in self.labels)
+
+
+def meanInterEventTime(df, column, unit='h'):
+    """
+    Average time between consecutive events of each group, computed for all groups at once.
+    The mean of the differences of a group's event times is (last - first) / (n - 1), so only
+    the first and last time and the number of events of each group are needed.
+
+    Inputs:
+    df - Events data frame
+    column - Name of the column holding the group values (e.g. repo or user)
+    unit - Time unit of the output, see np.timedelta64
+
+    Output: Series named time with the average time of each group, indexed by the group values in
+            groupby order.  Groups with a single event are NaN.
+    """
+
+    times = df.groupby(column)['time'].agg(['min', 'max', 'count'])
+    span = (times['max'] - times['min']).values.astype('timedelta64[ns]').astype(np.int64)
+    intervals = times['count'].values - 1
+    unit_ns = np.timedelta64(1, unit).astype('timedelta64[ns]').astype(np.int64)
+
+    #the mean is truncated to whole nanoseconds like the mean of a timedelta Series
+    mean = np.full(len(span), np.nan)
+    multiple = intervals > 0
+    mean[multiple] = (span[multiple] / intervals[multiple]).astype(np.int64) / unit_ns
+
+    return pd.Series(mean, index=times.index, name='time')
+
+
+def splitSeries(df, columns, start):
+    """
+    Split the event times of a data frame into one series per distinct value of the key columns
+
+    The rows are sorted by the key columns with a stable sort, so the times of each series keep the
+    order of df, and the series are ordered like the groups of df.groupby(columns).
+
+    Inputs:
+    df - Events data frame
+    columns - List of key column names (e.g. ['user'] or ['user','event'])
+    start - Timestamp the times are measured from
+
+    Outputs:
+    keys - List of the key values of each series, as tuples of the values of columns
+    offsets - Array of the offsets of each series in values (length len(keys) + 1)
+    values - int64 array of the event times in seconds since start
+    """
+
+    codes = []
+    uniques = []
+    for column in columns:
+        c, u = pd.factorize(df[column].values, sort=True)
+        codes.append(c)
+        uniques.append(u)
+
+    #lexsort sorts by the last key first
+    order = np.lexsort(codes[::-1]) if len(columns) > 0 else np.arange(len(df))
+    codes = [c[order] for c in codes]
+
+    change = np.zeros(len(order), dtype=bool)
+    if len(order) > 0:
+        change[0] = True
+    for c in codes:
+        change[1:] |= c[1:] != c[:-1]
+    starts = np.flatnonzero(change)
+
+    keys = list(zip(*[np.asarray(u)[c[starts]] for c, u in zip(codes, uniques)]))
+    offsets = np.append(starts, len(order)).astype(np.int64)
+
+    times = pd.to_datetime(df['time']).values[order]
+    values = ((times - np.datetime64(pd.Timestamp(start))) // np.timedelta64(1, 's')).astype(np.int64)
+
+    return keys, offsets, values
+
+
+def gatherSeries(offsets, values, rows, counts=None):
+    """
+    Select series of a CSR layout (offsets, values) into a new CSR layout
+
+    Inputs:
+    offsets, values - CSR layout of the series
+    rows - Array of the positions of the series to select
+    counts - (Optional) Number of consecutive selected series concatenated into each output series.
+             By default every selected series is one output series.
+
+    Outputs:
+    offsets, values - CSR layout of the selected series
+    """
+
+    rows = np.asarray(rows, dtype=np.int64)
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+
+    positions = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    index = np.repeat(starts - positions[:-1], lengths) + np.arange(positions[-1])
+
+    if counts is not None:
+        positions = positions[np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)]
+
+    return positions, values[index]
+
+
+class GroupSeries(object):
+    """
+    Event time series of the actors of several groups (e.g. the users of each repo) in a CSR layout
+
+    Series i has the key labels[i], a tuple whose first element is the group (e.g. (repo, user) or
+    (repo, user, event)), and the times values[offsets[i]:offsets[i + 1]] in seconds.  The series of
+    a group are consecutive.
+    """
+
+    def __init__(self, keys, offsets, values):
+        self.labels = list(keys)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.values = np.asarray(values, dtype=np.int64)
+
+        self.ranges = {}
+        for i, key in enumerate(self.labels):
+            first, last = self.ranges.get(key[0], (i, i))
+            self.ranges[key[0]] = (first, i + 1)
+
+    def __getitem__(self, i):
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def keys(self):
+        return list(self.labels)
+
+    def groups(self):
+        """
+        Groups in the order of their series
+        """
+        return sorted(self.ranges.keys(), key=lambda group: self.ranges[group][0])
+
+    def groupRange(self, group):
+        """
+        Positions (first, last + 1) of the series of a group
+        """
+        return self.ranges[group]
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def maxTime(self):
+        return self.values.max() if len(self.values) > 0 else 0.0
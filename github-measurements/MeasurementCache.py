@@ -0,0 +1,125 @@
+import os
+import hashlib
+import pickle as pkl
+
+'''
+On-disk cache of measurement outputs.
+
+Ground truth measurements only depend on the ground truth data set, so when many simulations are scored
+against the same ground truth, the ground truth side can be computed once and loaded afterwards.
+Entries are keyed by a fingerprint of the data set (a content hash of the input files and of the options
+which change the outputs), a fingerprint of the measurement code, the measurement name and the measurement arguments.
+'''
+
+#version of the cached outputs, part of every key.  Increase it for changes of the outputs which are not
+#changes of the measurement source files (e.g. a dependency upgrade).
+CACHE_VERSION = 1
+
+#source files of the measurements, whose content is part of every key so that entries computed by
+#other versions of the measurement code are never read
+measurement_sources = ['Measurements.py', 'UserCentricMeasurements.py', 'RepoCentricMeasurements.py',
+                       'CommunityCentricMeasurements.py', 'TEMeasurements.py', 'BinaryTE.py', 'GroupIndex.py',
+                       'EventStore.py']
+
+
+def fileHash(path, chunkSize=1 << 20):
+    """
+    SHA-1 hash of the content of a file, or of all files of a directory (e.g. an event store)
+    """
+
+    sha = hashlib.sha1()
+
+    if os.path.isdir(path):
+        paths = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+    else:
+        paths = [path]
+
+    for p in paths:
+        sha.update(os.path.basename(p).encode('utf-8'))
+        with open(p, 'rb') as handle:
+            chunk = handle.read(chunkSize)
+            while chunk:
+                sha.update(chunk)
+                chunk = handle.read(chunkSize)
+
+    return sha.hexdigest()
+
+
+def datasetFingerprint(paths, options=None):
+    """
+    Fingerprint of a data set
+
+    Inputs:
+    paths - List of input files (events file and the files defining the nodes and communities of interest).
+            Files which do not exist are skipped.
+    options - Any other values which change the measurement outputs (e.g. the interested users and repos)
+
+    Outputs:
+    Hex digest identifying the data set
+    """
+
+    sha = hashlib.sha1()
+    for path in paths:
+        if os.path.exists(path):
+            sha.update(fileHash(path).encode('utf-8'))
+    sha.update(repr(options).encode('utf-8'))
+
+    return sha.hexdigest()
+
+
+def codeFingerprint():
+    """
+    Fingerprint of the measurement code: CACHE_VERSION and the content of the measurement source files
+    """
+
+    sha = hashlib.sha1(str(CACHE_VERSION).encode('utf-8'))
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in measurement_sources:
+        sha.update(fileHash(os.path.join(directory, name)).encode('utf-8'))
+
+    return sha.hexdigest()
+
+
+class MeasurementCache(object):
+    """
+    Directory of pickled measurement outputs for one data set
+    """
+
+    def __init__(self, directory, fingerprint, version=None):
+        """
+        Inputs:
+        directory - Cache directory (created if it does not exist)
+        fingerprint - Data set fingerprint, see datasetFingerprint
+        version - (Optional) Fingerprint of the measurement code (defaults to codeFingerprint())
+        """
+
+        self.directory = directory
+        self.fingerprint = fingerprint
+        self.version = version if version is not None else codeFingerprint()
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, measurement_name, measurement_args):
+        args = repr(sorted(measurement_args.items()))
+        key = hashlib.sha1('|'.join([self.version, self.fingerprint, measurement_name, args]).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, measurement_name + '-' + key + '.pkl')
+
+    def contains(self, measurement_name, measurement_args):
+        return os.path.isfile(self.path(measurement_name, measurement_args))
+
+    def load(self, measurement_name, measurement_args):
+        with open(self.path(measurement_name, measurement_args), 'rb') as handle:
+            return pkl.load(handle)
+
+    def save(self, measurement_name, measurement_args, measurement):
+        """
+        Store a measurement output.  The file is written under a temporary name and then renamed,
+        so concurrent evaluations never read a partially written entry.
+        """
+
+        path = self.path(measurement_name, measurement_args)
+        tmp = path + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp, 'wb') as handle:
+            pkl.dump(measurement, handle, protocol=pkl.HIGHEST_PROTOCOL)
+        os.rename(tmp, path)
@@ -9,27 +9,74 @@ from UserCentricMeasurements import *
 from RepoCentricMeasurements import *
 from CommunityCentricMeasurements import *
 from TEMeasurements import *
+from EventStore import isEventStore, readEventStore, preprocessEvents, Vocabulary, id_columns
 from collections import defaultdict
-import jpype
+import os
+
+
+class lazy(object):
+    '''
+    Attribute computed by a method of the Measurements class the first time it is accessed.
+    The value is then stored on the object, so later accesses are plain attribute lookups
+    and the attribute can be assigned like any other attribute.
+    '''
+    def __init__(self, method):
+        self.method = method
+        self.__doc__ = method.__doc__
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        value = self.method(obj)
+        setattr(obj, self.method.__name__, value)
+        return value
+
 
 class Measurements(UserCentricMeasurements, RepoCentricMeasurements, TEMeasurements, CommunityCentricMeasurements):
     def __init__(self, dfLoc, interested_repos=[], interested_users=[], metaRepoData=False, metaUserData=False,
                  repoActorsFile='data/filtUsers-test.pkl',reposFile='data/filtRepos-test.pkl',topNodes=[],topEdges=[],
-                 previousActionsFile='data/prior_contribution_counts.csv'):
+                 previousActionsFile='data/prior_contribution_counts.csv',encodeIds=False,vocabulary=None,
+                 decodeResults=True,teEngine='numpy'):
         super(Measurements, self).__init__()
-        
+
+        #with encodeIds the event, user and repo columns of main_df hold integer codes of self.vocab
+        #instead of strings. Measurements translate ids at their inputs (encode) and outputs (decode).
+        if encodeIds or vocabulary is not None:
+            self.vocab = vocabulary if vocabulary is not None else Vocabulary()
+        else:
+            self.vocab = None
+
+        #with decodeResults=False measurement outputs keep the codes, which is only meaningful when the
+        #Measurements objects that are compared share one vocabulary (see EvaluationEngine)
+        self.decodeResults = decodeResults
+
         try:
             #check if input is a data frame
             dfLoc.columns
             df = dfLoc
+            preprocessed = False
         except:
-            #if not it should be a csv file path
-            df = pd.read_csv(dfLoc)
+            if isEventStore(dfLoc):
+                #event store directories are already in the preprocessed format (see EventStore.py)
+                df = readEventStore(dfLoc,vocabulary=self.vocab)
+                preprocessed = True
+            else:
+                #if not it should be a csv file path
+                df = pd.read_csv(dfLoc)
+                preprocessed = False
 
         self.contribution_events = ["PullRequestEvent", "PushEvent", "IssuesEvent","IssueCommentEvent","PullRequestReviewCommentEvent","CommitCommentEvent","CreateEvent"]
 
-        print('preprocessing...')
-        self.main_df = self.preprocess(df)
+        if preprocessed:
+            self.main_df = df
+        else:
+            print('preprocessing...')
+            self.main_df = self.preprocess(df)
+
+            if self.vocab is not None:
+                print('encoding ids...')
+                for col in id_columns:
+                    self.main_df[col] = self.vocab.update(col, self.main_df[col].values)
 
         print('splitting optional columns...')
         #store action and merged columns in a seperate data frame that is not used for most measurements
@@ -40,14 +87,15 @@ class Measurements(UserCentricMeasurements, RepoCentricMeasurements, TEMeasureme
             self.main_df_opt = None
 
 
-        #For repoCentric
-        print('getting selected repos...')
-        self.selectedRepos = self.getSelectRepos(interested_repos) #Dictionary of selected repos index == repoid
-
-        #For userCentric
-        self.selectedUsers = self.main_df[self.main_df.user.isin(interested_users)]
-
-
+        #the selected nodes, communities, previous counts and TE inputs are built on first use
+        #(see the lazy attributes below) so that single measurements do not pay for all of them
+        self.interested_repos = interested_repos
+        self.interested_users = interested_users
+        self.communitiesFile = os.path.abspath('data/communities.pkl')
+        self.previousActionsFile = os.path.abspath(previousActionsFile)
+        self.repoActorsFile = os.path.abspath(repoActorsFile)
+        self.reposFile = os.path.abspath(reposFile)
+        self.jarFile = os.path.abspath('infodynamics.jar')
 
         print('processing repo metatdata...')
         #read in external metadata files
@@ -65,31 +113,11 @@ class Measurements(UserCentricMeasurements, RepoCentricMeasurements, TEMeasureme
         else:
             self.useUserMetaData = False
 
-
-        #For Community
-        print('getting communities...')
-        self.communities = self.getCommunities()
-
-        #read in previous events count external file (used only for one measurement)
-        try:
-            print('reading previous counts...')
-            self.previous_event_counts = pd.read_csv(previousActionsFile)
-        except:
-            self.previous_event_counts = None
-
-
-        #For TE
-        print('starting jvm...')
-        if not jpype.isJVMStarted():
-            jpype.startJVM(jpype.getDefaultJVMPath(), "-ea", "-Djava.class.path=" + "infodynamics.jar")
+        self.loadMetaData()
 
         self.top_users = topNodes
         self.top_edges = topEdges
 
-        #read pkl files which define nodes of interest for TE measurements
-        self.repo_actors = self.readPickleFile(repoActorsFile)
-        self.repo_groups = self.readPickleFile(reposFile)
-
         #set TE parameters
         self.startTime = pd.Timestamp('2017-07-01 00:00:00')
         self.binSize = 3600
@@ -101,29 +129,158 @@ class Measurements(UserCentricMeasurements, RepoCentricMeasurements, TEMeasureme
         self.kN = 12
         self.nReps = 100
         self.bGetTS = True
+        #'numpy' computes the TE with BinaryTE.py, 'jidt' with the JIDT library (requires JPype and a JVM)
+        self.teEngine = teEngine
+        #seed of the surrogates of the TE significance tests of the numpy engine
+        self.teSeed = 0
+        #stop drawing surrogates once the significance of a pair is settled, see getTESigMatrixNumpy
+        self.teSequential = False
+        self.te_surrogates = {}
+        self.te_prune_stats = {}
+        #number of processes computing the TE of the repos (repo groups) in parallel, None for all cores
+        self.teCPU = None
+        #results of the TE measurements by configuration, see getTEResultKey
+        self.te_results = {}
+
+    #For repoCentric
+    @lazy
+    def selectedRepos(self):
+        print('getting selected repos...')
+        return self.getSelectRepos(self.interested_repos) #GroupIndex of selected repos index == repoid
+
+    #For userCentric
+    @lazy
+    def selectedUsers(self):
+        return self.main_df[self.main_df.user.isin(self.encode('user', self.interested_users))]
+
+    #For Community
+    @lazy
+    def communities(self):
+        print('getting communities...')
+        return self.getCommunities(self.communitiesFile)
+
+    #read in previous events count external file (used only for one measurement)
+    @lazy
+    def previous_event_counts(self):
+        try:
+            print('reading previous counts...')
+            previous_event_counts = pd.read_csv(self.previousActionsFile)
+            for col in ['user','repo']:
+                previous_event_counts[col] = self.encode(col, previous_event_counts[col])
+            return previous_event_counts
+        except:
+            return None
+
+    #read pkl files which define nodes of interest for TE measurements
+    @lazy
+    def repo_actors(self):
+        return self.readPickleFile(self.repoActorsFile)
+
+    @lazy
+    def repo_groups(self):
+        return self.readPickleFile(self.reposFile)
+
+    #For TE
+    def startJVM(self):
+        if jpype is None:
+            raise ImportError("JPype is required for the JIDT TE engine, use teEngine='numpy' instead")
+        if not jpype.isJVMStarted():
+            print('starting jvm...')
+            jpype.startJVM(jpype.getDefaultJVMPath(), "-ea", "-Djava.class.path=" + self.jarFile)
 
     def preprocess(self,df):
         #edit columns, convert date, sort by date
-        if df.columns[0] == '_id':
-            del df['_id']
-        if len(df.columns) == 4:
-            df.columns = ['time', 'event', 'user', 'repo']
-        else:
-            df.columns = ['time', 'event', 'user', 'repo','action','merged']
-        df['time'] = pd.to_datetime(df['time'])
-        df = df.sort_values(by='time')
-        return df
+        return preprocessEvents(df)
 
     def preprocessRepoMeta(self,df):
         df.columns = ['repo','created_at','owner_id','language']
         df['created_at'] = pd.to_datetime(df['created_at'])
+        df['repo'] = self.encode('repo', df['repo'])
         return df
 
     def preprocessUserMeta(self,df):
         df.columns = ['user','created_at','location','company']
         df['created_at'] = pd.to_datetime(df['created_at'])
+        df['user'] = self.encode('user', df['user'])
         return df
 
+    '''
+    Translate ids or event types to the representation used in main_df.
+    Inputs: column - One of event, user or repo
+            values - A single value or a list of values
+    Output: The values unchanged if ids are not encoded, otherwise their codes (-1 for unknown values)
+    '''
+    def encode(self,column,values):
+        if self.vocab is None or values is None:
+            return values
+
+        if np.ndim(values) == 0:
+            return self.vocab.encode(column, [values])[0]
+        else:
+            return self.vocab.encode(column, list(values))
+
+    '''
+    Translate the encoded event, user and repo columns and index levels of a measurement result back to ids.
+    Inputs: result - A data frame or series
+    Output: The result with decoded ids
+    '''
+    def decode(self,result):
+        if self.vocab is None or result is None:
+            return result
+
+        if isinstance(result, pd.DataFrame):
+            cols = [col for col in result.columns if col in id_columns]
+            if len(cols) > 0:
+                result = result.assign(**{col: self.vocab.decode(col, result[col].values) for col in cols})
+
+        if isinstance(result.index, pd.MultiIndex):
+            levels = [pd.Index(self.vocab.decode(name, level.values)) if name in id_columns else level
+                      for name, level in zip(result.index.names, result.index.levels)]
+            result.index = result.index.set_levels(levels)
+        elif result.index.name in id_columns:
+            result.index = pd.Index(self.vocab.decode(result.index.name, result.index.values), name=result.index.name)
+
+        return result
+
+    '''
+    Reorder a result indexed by encoded ids into the order of the original ids, i.e. the order in which
+    groupby returns string ids.  Ranked measurements apply this before sorting so that ties keep their order.
+    Inputs: result - A data frame or series indexed by event, user or repo
+    Output: The reordered result
+    '''
+    def sortIds(self,result):
+        if self.vocab is None or result.index.name not in id_columns:
+            return result
+
+        ids = pd.Series(self.vocab.decode(result.index.name, result.index.values))
+        return result.iloc[ids.sort_values(kind='mergesort').index.values]
+
+    '''
+    Decode a measurement output unless the Measurements object was created with decodeResults=False.
+    Inputs: result - A data frame or series returned by a measurement
+    Output: The result with decoded or encoded ids
+    '''
+    def decodeResult(self,result):
+        if not self.decodeResults:
+            return result
+        return self.decode(result)
+
+    '''
+    Translate a single encoded id back to the original id.
+    '''
+    def decodeValue(self,column,value):
+        if self.vocab is None:
+            return value
+        return self.vocab.decode(column, [value])[0]
+
+    '''
+    Translate an array of encoded ids back to the original ids.
+    '''
+    def decodeValues(self,column,values):
+        if self.vocab is None:
+            return values
+        return self.vocab.decode(column, values)
+
     def readPickleFile(self,ipFile):
 
         with open(ipFile, 'rb') as handle:
@@ -1,6 +1,7 @@
 from scipy.stats import entropy, ks_2samp, spearmanr, pearsonr
 from sklearn.metrics import r2_score
 from scipy.spatial.distance import euclidean
+from scipy.special import betainc
 import statsmodels.api as sm
 import fastdtw as fdtw
 import pandas as pd
@@ -53,6 +54,95 @@ def get_hist_bins(ground_truth, simulation, method='auto'):
     return (bins)
 
 
+class DistributionComparison(object):
+    """
+    Ground truth and simulation measurements prepared for the distributional metrics
+    (js_divergence, kl_divergence, kl_divergence_smoothed, ks_test).
+    Each sample is sorted once, the bins and histograms are computed once per binning method
+    and the discrete distributions are joined once, however many of the metrics are run on the pair
+    (see the comparison argument of the metrics).
+
+    Inputs:
+    ground_truth: Ground truth measurement
+    simulation: Simulation measurement
+    """
+
+    def __init__(self, ground_truth, simulation):
+
+        self.ground_truth = ground_truth
+        self.simulation = simulation
+
+        self._sorted = None
+        self._bins = {}
+        self._histograms = {}
+        self._joined = None
+
+    def sorted_values(self):
+        """
+        Sorted ground truth and simulation values
+        """
+
+        if self._sorted is None:
+            ground_truth, simulation = check_data_types(self.ground_truth, self.simulation)
+            self._sorted = (np.sort(ground_truth), np.sort(simulation))
+
+        return self._sorted
+
+    def bins(self, method='auto'):
+        """
+        Bin edges for the combined data sets, see get_hist_bins
+        """
+
+        if method not in self._bins:
+            self._bins[method] = get_hist_bins(*self.sorted_values(), method=method)
+
+        return self._bins[method]
+
+    def histograms(self, method='auto'):
+        """
+        Ground truth and simulation counts in the bins of the given method.
+        The counts are read off the sorted values and are equal to those of np.histogram
+        (half-open bins except for the last, which includes its right edge).
+        """
+
+        if method not in self._histograms:
+            bins = self.bins(method)
+            counts = []
+            for values in self.sorted_values():
+                edges = np.searchsorted(values, bins, side='left')
+                edges[-1] = np.searchsorted(values, bins[-1], side='right')
+                counts.append(np.diff(edges))
+            self._histograms[method] = tuple(counts)
+
+        return self._histograms[method]
+
+    def joined(self):
+        """
+        Ground truth and simulation values of a discrete distribution aligned on their keys (outer join filled with 0)
+        """
+
+        if self._joined is None:
+            df = join_dfs(self.ground_truth, self.simulation, join='outer', fill_value=0)
+            self._joined = (df['value_gt'].values.astype(float), df['value_sim'].values.astype(float))
+
+        return self._joined
+
+    def ks_statistic(self):
+        """
+        Two-sample Kolmogorov-Smirnov statistic (the statistic of scipy.stats.ks_2samp) computed from the sorted values
+        """
+
+        ground_truth, simulation = self.sorted_values()
+        if len(ground_truth) == 0 or len(simulation) == 0:
+            return None
+
+        all_values = np.concatenate([ground_truth, simulation])
+        cdf_gt = np.searchsorted(ground_truth, all_values, side='right') / float(len(ground_truth))
+        cdf_sim = np.searchsorted(simulation, all_values, side='right') / float(len(simulation))
+
+        return np.max(np.absolute(cdf_gt - cdf_sim))
+
+
 def absolute_difference(ground_truth, simulation):
     """
     Absolute difference between ground truth simulation measurement
@@ -66,7 +156,7 @@ def absolute_difference(ground_truth, simulation):
         return None
 
 
-def kl_divergence(ground_truth, simulation, discrete=False):
+def kl_divergence(ground_truth, simulation, discrete=False, comparison=None):
     """
     KL Divergence between the ground truth and simulation data
     Meant for distributional measurements
@@ -75,31 +165,24 @@ def kl_divergence(ground_truth, simulation, discrete=False):
     ground_truth: Ground truth measurement
     simulation: Simulation measurement
     discrete: Whether the distribution is over discrete values (e.g. days of the week) (True) or numeric values (False)
+    comparison: (Optional) DistributionComparison of the pair shared with the other distributional metrics run on it
 
     """
 
     if simulation is None:
         return None
 
+    if comparison is None:
+        comparison = DistributionComparison(ground_truth, simulation)
+
     # if data is numeric, compute histogram
     if not discrete:
 
-        ground_truth, simulation = check_data_types(ground_truth, simulation)
-
-        bins = get_hist_bins(ground_truth, simulation,method='doane')
-
-        ground_truth = np.histogram(ground_truth, bins=bins)[0]
-        simulation = np.histogram(simulation, bins=bins)[0]
+        ground_truth, simulation = comparison.histograms('doane')
 
     else:
 
-        df = ground_truth.merge(simulation,
-                                on=[c for c in ground_truth.columns if c != 'value'],
-                                suffixes=('_gt', '_sim'),
-                                how='outer').fillna(0)
-
-        ground_truth = df['value_gt'].values.astype(float)
-        simulation = df['value_sim'].values.astype(float)
+        ground_truth, simulation = comparison.joined()
         ground_truth = ground_truth / ground_truth.sum()
         simulation = simulation / simulation.sum()
 
@@ -110,38 +193,32 @@ def kl_divergence(ground_truth, simulation, discrete=False):
         return None
 
 
-def kl_divergence_smoothed(ground_truth, simulation, alpha=0.01, discrete=False):
+def kl_divergence_smoothed(ground_truth, simulation, alpha=0.01, discrete=False, comparison=None):
     """
     Smoothed version of the KL divergence which smooths the simulation output to prevent
     infinities in the KL divergence output
 
     Additional input:
     alpha - smoothing parameter
+    comparison - (Optional) DistributionComparison of the pair shared with the other distributional metrics run on it
     """
 
+    if comparison is None:
+        comparison = DistributionComparison(ground_truth, simulation)
+
     # if data is numeric, compute histogram
     if not discrete:
 
-        ground_truth, simulation = check_data_types(ground_truth, simulation)
-
-        bins = get_hist_bins(ground_truth, simulation)
-
-        ground_truth = np.histogram(ground_truth, bins=bins)[0]
-        simulation = np.histogram(simulation, bins=bins)[0]
-        smoothed_simulation = (1 - alpha) * simulation + alpha * (np.ones(simulation.shape))
+        ground_truth, simulation = comparison.histograms('auto')
 
     else:
 
-        df = ground_truth.merge(simulation,
-                                on=[c for c in ground_truth.columns if c != 'value'],
-                                suffixes=('_gt', '_sim'),
-                                how='outer').fillna(0)
-
-        ground_truth = df['value_gt'].values.astype(float)
-        simulation = df['value_sim'].values.astype(float)
+        ground_truth, simulation = comparison.joined()
         ground_truth = ground_truth / ground_truth.sum()
         simulation = simulation / simulation.sum()
 
+    smoothed_simulation = (1 - alpha) * simulation + alpha * (np.ones(simulation.shape))
+
     if len(ground_truth) == len(simulation):
         return entropy(ground_truth, smoothed_simulation)
     else:
@@ -149,9 +226,15 @@ def kl_divergence_smoothed(ground_truth, simulation, alpha=0.01, discrete=False)
         return None
 
 
-def dtw(ground_truth, simulation):
+def dtw(ground_truth, simulation, window=None):
     """
     Dynamic Time Warping implemenation
+
+    Inputs:
+    ground_truth - ground truth measurement
+    simulation - simulation measurement
+    window - (Optional) Width of the Sakoe-Chiba band, i.e. the largest allowed offset between aligned time steps.
+             None computes the unconstrained distance.
     """
 
 
@@ -166,13 +249,70 @@ def dtw(ground_truth, simulation):
 
 
     if len(simulation) > 0:
-        dist = fdtw.dtw(ground_truth.tolist(), simulation, dist=euclidean)[0]
+        dist = dtw_distance(ground_truth, simulation, window=window)
     else:
         dist = None
 
     return dist
 
 
+def dtw_distance(x, y, window=None):
+    """
+    Dynamic time warping distance of two 1-D series with the absolute difference as the local cost,
+    the distance of fdtw.dtw(x, y, dist=euclidean).
+
+    The cost matrix is filled one anti-diagonal at a time: the cells (i, j) with i + j = k only depend on the
+    diagonals k - 1 and k - 2, so each diagonal is a single vectorized update and only three diagonals are kept.
+
+    Inputs:
+    x, y - Series
+    window - (Optional) Width of the Sakoe-Chiba band: only cells with |i - j| <= window are filled.
+             It is widened to the length difference of the series so that an alignment exists.
+
+    Outputs:
+    DTW distance
+    """
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    m = len(y)
+
+    if n == 0 or m == 0:
+        return 0.0 if n == m else np.inf
+
+    if window is None:
+        window = max(n, m)
+    window = max(window, abs(n - m))
+
+    #diagonal k holds the cumulative costs D[i, k - i] at index i, with D[0, 0] = 0 and all other cells infinite.
+    #every buffer remembers the index range it was written to so that only that range has to be reset on reuse
+    diagonals = [np.full(n + 1, np.inf) for _ in range(3)]
+    written = [(0, 1), (0, 0), (0, 0)]
+    diagonals[0][0] = 0.0
+
+    for k in range(2, n + m + 1):
+        prev2 = diagonals[(k - 2) % 3]
+        prev1 = diagonals[(k - 1) % 3]
+        cur = diagonals[k % 3]
+
+        start, stop = written[k % 3]
+        cur[start:stop] = np.inf
+
+        #rows of the cells of the diagonal inside the matrix and the band
+        lo = max(1, k - m, (k - window + 1) // 2)
+        hi = min(n, k - 1, (k + window) // 2)
+        if lo > hi:
+            written[k % 3] = (0, 0)
+            continue
+
+        cost = np.absolute(x[lo - 1:hi] - y[k - hi - 1:k - lo][::-1])
+        cur[lo:hi + 1] = cost + np.minimum(np.minimum(prev2[lo - 1:hi], prev1[lo - 1:hi]), prev1[lo:hi + 1])
+        written[k % 3] = (lo, hi + 1)
+
+    return float(diagonals[(n + m) % 3][n])
+
+
 def fast_dtw(ground_truth, simulation):
     """
     Fast Dynamic Time Warping implemenation
@@ -190,7 +330,7 @@ def fast_dtw(ground_truth, simulation):
     return dist
 
 
-def js_divergence(ground_truth, simulation, discrete=False, base=2.0):
+def js_divergence(ground_truth, simulation, discrete=False, base=2.0, comparison=None):
     """
     Jensen-Shannon Divergence implemenation
     A symmetric variant on KL Divergence which also avoids infinite outputs
@@ -199,31 +339,23 @@ def js_divergence(ground_truth, simulation, discrete=False, base=2.0):
     ground_truth - ground truth measurement
     simulation - simulation measurement
     base - the logarithmic base to use
+    comparison - (Optional) DistributionComparison of the pair shared with the other distributional metrics run on it
     """
 
 
     if simulation is None or len(simulation) == 0 or ground_truth is None or len(ground_truth) == 0:
         return None
 
-    if not discrete:
-
-
-        ground_truth, simulation = check_data_types(ground_truth, simulation)
+    if comparison is None:
+        comparison = DistributionComparison(ground_truth, simulation)
 
-        bins = get_hist_bins(ground_truth, simulation,method='doane')
+    if not discrete:
 
-        ground_truth = np.histogram(ground_truth, bins=bins)[0].astype(float)
-        simulation = np.histogram(simulation, bins=bins)[0].astype(float)
+        ground_truth, simulation = [h.astype(float) for h in comparison.histograms('doane')]
 
     else:
 
-        df = ground_truth.merge(simulation,
-                                on=[c for c in ground_truth.columns if c != 'value'],
-                                suffixes=('_gt', '_sim'),
-                                how='outer').fillna(0)
-
-        ground_truth = df['value_gt'].values.astype(float)
-        simulation = df['value_sim'].values.astype(float)
+        ground_truth, simulation = comparison.joined()
     
         
     ground_truth = ground_truth / ground_truth.sum()
@@ -269,7 +401,7 @@ def rbo_for_te(ground_truth,simulation,idx,wt,ct):
     return metric
 
 
-def rbo_score(ground_truth, simulation, p=0.95):
+def rbo_score(ground_truth, simulation, p=0.95, extrapolate=False):
     """
     Rank biased overlap (RBO) implementation
     http://codalism.com/research/papers/wmz10_tois.pdf
@@ -281,6 +413,9 @@ def rbo_score(ground_truth, simulation, p=0.95):
     p - RBO parameter ranging from 0 to 1 that determines how much to overweight the the upper portion of the list
         p = 0 means only the first element is considered
         p = 1 means all ranks are weighted equally
+    extrapolate - If True return the extrapolated RBO (RBO_ext, equation 32 of the paper), which assumes the agreement
+                  observed at the end of the lists continues below them.  Otherwise return the RBO over the ranks 1
+                  through the length of the shorter list.
     """
 
 
@@ -290,31 +425,56 @@ def rbo_score(ground_truth, simulation, p=0.95):
     except:
         ''
 
-    sl, ll = sorted([(len(ground_truth), ground_truth), (len(simulation), simulation)])
+    sl, ll = sorted([(len(ground_truth), ground_truth), (len(simulation), simulation)], key=lambda x: x[0])
     s, S = sl
     l, L = ll
     if s == 0: return 0
 
     # Calculate the overlaps at ranks 1 through s
-    # (the shorter of the two lists)
+    # (the shorter of the two lists), or through l for the extrapolated RBO
+    depth = l if extrapolate else s
+    x_d = rbo_overlaps(L, S, depth)
+    d = np.arange(1, depth + 1)
+
+    if not extrapolate:
+        return float((1 - p) * np.sum(x_d / d * np.power(p, d - 1)))
+
+    x_s = x_d[s - 1]
+    x_l = x_d[l - 1]
+    # The factor 1 / p of equation 32 is folded into the powers of p, so p = 0 gives the overlap at rank 1
+    rbo_ext = np.sum(x_d / d * np.power(p, d - 1)) + np.sum((x_s * (d[s:] - s) / (s * d[s:])) * np.power(p, d[s:] - 1))
+    rbo_ext = rbo_ext * (1 - p) + ((x_l - x_s) / float(l) + x_s / float(s)) * np.power(p, l)
 
-    x_d = {}
-    rbo_score = 0.0
+    return float(rbo_ext)
 
-    for i in range(1, s + 1):
-        x = L[:i]
-        y = S[:i]
 
-        x_d[i] = len(set(x).intersection(set(y)))
+def rbo_overlaps(L, S, depth):
+    """
+    Overlaps of the prefixes of two ranked lists, computed in one pass
+
+    An item is in both prefixes of length d from the depth max(first rank in L, first rank in S) on, so the
+    overlaps at all depths are the cumulative counts of these depths.
+
+    Inputs:
+    L, S - Ranked lists
+    depth - Number of ranks
 
+    Outputs:
+    Array of the sizes of the intersections of set(L[:d]) and set(S[:d]) for d = 1 through depth
+    """
 
-    for i in range(1,s+1):
-        rbo_score += (float(x_d[i])/float(i)) * pow(p, (i-1))
+    codes = pd.factorize(pd.Series(list(L) + list(S), dtype=object))[0]
+    n = codes.max() + 1 if len(codes) > 0 else 0
 
+    def first_ranks(list_codes):
+        ranks = np.full(n, depth + 1, dtype=np.int64)
+        items, first = np.unique(list_codes, return_index=True)
+        ranks[items] = first + 1
+        return ranks
 
-    rbo_score = rbo_score * (1 - p)
+    both = np.maximum(first_ranks(codes[:len(L)]), first_ranks(codes[len(L):]))
 
-    return rbo_score
+    return np.cumsum(np.bincount(both[both <= depth], minlength=depth + 1))[1:]
 
 
 # Weight given to the top d ranks for a given p
@@ -396,22 +556,207 @@ def pearson(ground_truth, simulation, join='inner', fill_value=0):
         return None
 
 
-def ks_test(ground_truth, simulation):
+def ks_test(ground_truth, simulation, comparison=None):
     """
     Kolmogorov-Smirnov test
     Meant for measurements which are continous or numeric distributions
+
+    Inputs:
+    ground_truth - ground truth measurement
+    simulation - simulation measurement
+    comparison - (Optional) DistributionComparison of the pair shared with the other distributional metrics run on it
     """
 
     if simulation is None or len(simulation) == 0:
         return None
 
-    ground_truth, simulation = check_data_types(ground_truth,simulation)
+    if comparison is None:
+        comparison = DistributionComparison(ground_truth, simulation)
 
-    try:
-        return ks_2samp(ground_truth,simulation).statistic
-    except:
+    return comparison.ks_statistic()
+
+
+def stack_nodes(measurement, nodes, key='node'):
+    """
+    Stack the outputs of a node or community level measurement into one long-format data frame
+
+    Inputs:
+    measurement - Dictionary of measurement outputs keyed by node, data frames with the measurement in the "value" column
+                  or arrays of values
+    nodes - Nodes to include
+    key - Name of the node key column
+
+    Outputs:
+    Data frame with the position of the node in nodes in the key column and the columns of the node outputs,
+    or None if the node outputs do not share a common layout
+    """
+
+    frames = []
+    for node in nodes:
+        output = measurement[node]
+        if isinstance(output, pd.DataFrame):
+            if 'value' not in output.columns or key in output.columns:
+                return None
+            frames.append(output)
+        elif isinstance(output, (pd.Series, np.ndarray, list)):
+            frames.append(pd.DataFrame({'value': np.asarray(output)}))
+        else:
+            return None
+
+    if len(frames) == 0 or any(list(f.columns) != list(frames[0].columns) for f in frames):
+        return None
+
+    df = pd.concat(frames, ignore_index=True)
+    df.insert(0, key, np.repeat(np.arange(len(frames)), [len(f.index) for f in frames]))
+
+    return(df)
+
+
+def node_rmse(ground_truth, simulation, key='node', join='inner', fill_value=0):
+    """
+    Root mean squared error of every node, see rmse
+
+    Inputs:
+    ground_truth - long-format ground truth measurement (data frame) with the node in the key column and the measurement in the "value" column
+    simulation - long-format simulation measurement (data frame) with the node in the key column and the measurement in the "value" column
+    key - Name of the node key column
+    join - type of join to perform between ground truth and simulation
+    fill_value - fill value for non-overlapping joins
+
+    Outputs:
+    Dictionary of the metric keyed by node (nodes without joined rows are left out)
+    """
+
+    df = join_dfs(ground_truth,simulation,join=join,fill_value=fill_value)
+
+    df['error'] = (df["value_sim"] - df["value_gt"]) ** 2
+
+    return np.sqrt(df.groupby(key)['error'].mean()).to_dict()
+
+
+def node_r2(ground_truth, simulation, key='node', join='inner', fill_value=0):
+    """
+    R-squared value between ground truth and simulation of every node, see r2 and node_rmse
+    """
+
+    df = join_dfs(ground_truth,simulation,join=join,fill_value=fill_value)
+
+    grouped = df.groupby(key)
+    df['residual'] = (df["value_gt"] - df["value_sim"]) ** 2
+    df['total'] = (df["value_gt"] - grouped["value_gt"].transform('mean')) ** 2
+    sums = df.groupby(key)[['residual','total']].sum()
+
+    #same conventions as r2_score for constant ground truth values and single values
+    score = pd.Series(0.0, index=sums.index)
+    score[sums['residual'] == 0] = 1.0
+    valid = sums['total'] != 0
+    score[valid] = 1 - sums['residual'][valid] / sums['total'][valid]
+    score[grouped.size() < 2] = np.nan
+
+    return score.to_dict()
+
+
+def node_pearson(ground_truth, simulation, key='node', join='inner', fill_value=0):
+    """
+    Pearson correlation coefficient and its two-sided p-value between simulation and ground truth of every node,
+    see pearson and node_rmse
+    """
+
+    df = join_dfs(ground_truth,simulation,join=join,fill_value=fill_value)
+
+    grouped = df.groupby(key)
+    df['dx'] = df["value_gt"] - grouped["value_gt"].transform('mean')
+    df['dy'] = df["value_sim"] - grouped["value_sim"].transform('mean')
+    df['dxy'] = df['dx'] * df['dy']
+    df['dx'] = df['dx'] ** 2
+    df['dy'] = df['dy'] ** 2
+    sums = df.groupby(key)[['dxy','dx','dy']].sum()
+    n = grouped.size()
+
+    r = (sums['dxy'] / np.sqrt(sums['dx'] * sums['dy'])).clip(-1.0, 1.0)
+
+    #p-value from the t distribution with n - 2 degrees of freedom, 1 for two values as in pearsonr
+    dof = (n - 2).values.astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_squared = (r ** 2).values * (dof / ((1.0 - r.values) * (1.0 + r.values)))
+        prob = pd.Series(betainc(0.5 * dof, 0.5, dof / (dof + t_squared)), index=r.index)
+    prob[r.abs() == 1.0] = 0.0
+    prob[n == 2] = 1.0
+
+    return {node: (r[node], prob[node]) for node in r.index}
+
+
+def node_ks_test(ground_truth, simulation, key='node'):
+    """
+    Kolmogorov-Smirnov statistic of every node, see ks_test
+
+    Both samples are sorted together once by node and value.  The statistic of a node is the largest difference
+    of the two empirical distribution functions at the last row of each of its distinct values.
+
+    Inputs:
+    ground_truth - long-format ground truth measurement (data frame) with the node in the key column and the measurement in the "value" column
+    simulation - long-format simulation measurement (data frame) with the node in the key column and the measurement in the "value" column
+    key - Name of the node key column
+
+    Outputs:
+    Dictionary of the metric keyed by node (nodes without values in either sample are left out)
+    """
+
+    df = pd.concat([ground_truth[[key,'value']].assign(gt=1, sim=0),
+                    simulation[[key,'value']].assign(gt=0, sim=1)], ignore_index=True)
+    df = df.sort_values([key,'value'], kind='mergesort')
+
+    grouped = df.groupby(key)[['gt','sim']]
+    cdf = grouped.cumsum() / grouped.transform('sum')
+
+    last = ~df.duplicated([key,'value'], keep='last')
+    statistic = (cdf['gt'] - cdf['sim'])[last].abs().groupby(df[key][last]).max()
+
+    counts = grouped.sum()
+    statistic = statistic[(counts['gt'] > 0) & (counts['sim'] > 0)]
+
+    return statistic.to_dict()
+
+
+#node-level versions of the metrics which are computed for all nodes in one grouped operation
+node_metrics = {rmse: node_rmse,
+                r2: node_r2,
+                pearson: node_pearson,
+                ks_test: node_ks_test}
+
+#node-level metrics which compare distributions of values rather than joined values
+distribution_node_metrics = [node_ks_test]
+
+#metrics which take a DistributionComparison of the pair as the comparison argument
+distribution_metrics = [kl_divergence, kl_divergence_smoothed, js_divergence, ks_test]
+
+
+def is_distribution_metric(metric):
+    """
+    Whether a metric function (or a partial of one) takes a DistributionComparison as the comparison argument
+    """
+
+    return getattr(metric, 'func', metric) in distribution_metrics
+
+
+def get_node_metric(metric, joined=True):
+    """
+    Node-level version of a metric function (or of a partial of one) or None if there is none
+
+    Inputs:
+    metric - Metric function
+    joined - Whether the node outputs have key columns to join the ground truth and simulation on.
+             Otherwise only the distributional metrics have a node-level version.
+    """
+
+    node_metric = node_metrics.get(getattr(metric, 'func', metric))
+    if node_metric is None or (not joined and node_metric not in distribution_node_metrics):
         return None
 
+    keywords = getattr(metric, 'keywords', None) or {}
+
+    return lambda ground_truth, simulation: node_metric(ground_truth, simulation, **keywords)
+
 
 def join_dfs(ground_truth,simulation,join='inner',fill_value=0):
 
@@ -425,10 +770,155 @@ def join_dfs(ground_truth,simulation,join='inner',fill_value=0):
     fill_value - Value for filling NAs
     """
 
+    on = [c for c in ground_truth.columns if c != 'value']
+
+    if is_unique_integer_key(ground_truth, simulation, on):
+        return join_unique_keys(ground_truth, simulation, on[0], join=join, fill_value=fill_value)
+
+    if is_regular_time_key(ground_truth, simulation, on):
+        gt_to_sim = align_regular_times(ground_truth[on[0]].values, simulation[on[0]].values)
+        return join_unique_keys(ground_truth, simulation, on[0], join=join, fill_value=fill_value, gt_to_sim=gt_to_sim)
+
+    #outer joins are sorted by the keys (as pandas >= 2.2 always does) so that the row order,
+    #which matters for time series metrics such as dtw, does not depend on the pandas version
     df = ground_truth.merge(simulation,
-                            on = [c for c in ground_truth.columns if c != 'value'],
+                            on = on,
                             suffixes = ('_gt','_sim'),
-                            how=join).fillna(fill_value)
+                            how=join,
+                            sort=(join == 'outer')).fillna(fill_value)
+
+    return(df)
+
+
+def is_unique_integer_key(ground_truth, simulation, on):
+    """
+    Check whether two measurement data frames are keyed by a single integer column with unique values in each,
+    e.g. the user or repo codes of Measurements objects sharing a vocabulary
+    """
+
+    if len(on) != 1 or 'value' not in ground_truth.columns or set(simulation.columns) != set(ground_truth.columns):
+        return False
+
+    for df in [ground_truth, simulation]:
+        if len(df.index) == 0 or not pd.api.types.is_integer_dtype(df[on[0]].dtype) or not df[on[0]].is_unique:
+            return False
+
+    return True
+
+
+def is_regular_time_key(ground_truth, simulation, on):
+    """
+    Check whether two measurement data frames are keyed by a single sorted time column
+    and the simulation times are regularly spaced, e.g. daily timelines
+    """
+
+    if len(on) != 1 or 'value' not in ground_truth.columns or set(simulation.columns) != set(ground_truth.columns):
+        return False
+
+    for df in [ground_truth, simulation]:
+        if len(df.index) == 0 or not pd.api.types.is_datetime64_dtype(df[on[0]].dtype):
+            return False
+
+    gt_steps = np.diff(ground_truth[on[0]].values)
+    sim_steps = np.diff(simulation[on[0]].values)
+
+    if not (gt_steps > np.timedelta64(0)).all():
+        return False
+
+    return len(sim_steps) == 0 or bool(sim_steps[0] > np.timedelta64(0) and (sim_steps == sim_steps[0]).all())
+
+
+def align_regular_times(gt_times, sim_times):
+    """
+    Position of every ground truth time in a regularly spaced array of simulation times (-1 if it does not occur),
+    from the offset to the first simulation time instead of a search
+
+    Inputs:
+    gt_times - Ground truth times
+    sim_times - Sorted, regularly spaced simulation times
+    """
+
+    gt_times = gt_times.astype('datetime64[ns]').view(np.int64)
+    sim_times = sim_times.astype('datetime64[ns]').view(np.int64)
+
+    step = sim_times[1] - sim_times[0] if len(sim_times) > 1 else 1
+    pos = (gt_times - sim_times[0]) // step
+
+    inside = np.flatnonzero((pos >= 0) & (pos < len(sim_times)))
+    inside = inside[sim_times[pos[inside]] == gt_times[inside]]
+
+    gt_to_sim = np.full(len(gt_times), -1, dtype=np.int64)
+    gt_to_sim[inside] = pos[inside]
+
+    return gt_to_sim
+
+
+def join_unique_keys(ground_truth, simulation, key, join='inner', fill_value=0, gt_to_sim=None):
+    """
+    Join two measurement data frames on a key with unique values in each by array alignment instead of a hash merge.
+    The output has the same rows, row order and columns as the merge of join_dfs:
+    inner and left joins in ground truth order, right joins in simulation order and outer joins sorted by the key.
+
+    Inputs:
+    ground_truth - Ground truth measurement data frame with a key column and a "value" column
+    simulation - Simulation measurement data frame with a key column and a "value" column
+    key - Name of the key column
+    join - Join method (inner, outer, left, right)
+    fill_value - Value for filling NAs
+    gt_to_sim - (Optional) Position of every ground truth key in the simulation data (-1 if it does not occur).
+                By default it is found with a binary search of the sorted simulation keys.
+    """
+
+    gt_keys = ground_truth[key].values
+    sim_keys = simulation[key].values
+
+    #position of every ground truth key in the simulation data (-1 if it does not occur)
+    if gt_to_sim is None and len(sim_keys) > 0:
+        order = np.argsort(sim_keys, kind='mergesort')
+        pos = np.searchsorted(sim_keys[order], gt_keys)
+        pos[pos == len(sim_keys)] = 0
+        gt_to_sim = np.where(sim_keys[order][pos] == gt_keys, order[pos], -1)
+    elif gt_to_sim is None:
+        gt_to_sim = np.full(len(gt_keys), -1, dtype=np.int64)
+
+    if join == 'right':
+        sim_rows = np.arange(len(sim_keys))
+        gt_rows = np.full(len(sim_keys), -1, dtype=np.int64)
+        gt_rows[gt_to_sim[gt_to_sim >= 0]] = np.flatnonzero(gt_to_sim >= 0)
+    else:
+        if join == 'inner':
+            gt_rows = np.flatnonzero(gt_to_sim >= 0)
+        else:
+            gt_rows = np.arange(len(gt_keys))
+        sim_rows = gt_to_sim[gt_rows]
+
+    if join == 'outer':
+        matched = np.zeros(len(sim_keys), dtype=bool)
+        matched[sim_rows[sim_rows >= 0]] = True
+        extra = np.flatnonzero(~matched)
+        sim_rows = np.concatenate([sim_rows, extra])
+        gt_rows = np.concatenate([gt_rows, np.full(len(extra), -1, dtype=gt_rows.dtype)])
+
+    def take(values, rows):
+        if (rows < 0).any():
+            out = np.full(len(rows), fill_value, dtype=float)
+            out[rows >= 0] = values[rows[rows >= 0]]
+            return out
+        return values[rows]
+
+    keys = np.empty(len(gt_rows), dtype=gt_keys.dtype)
+    in_gt = gt_rows >= 0
+    keys[in_gt] = gt_keys[gt_rows[in_gt]]
+    keys[~in_gt] = sim_keys[sim_rows[~in_gt]]
+
+    if join == 'outer':
+        order = np.argsort(keys, kind='mergesort')
+        keys, gt_rows, sim_rows = keys[order], gt_rows[order], sim_rows[order]
+
+    df = pd.DataFrame({key: keys,
+                       'value_gt': take(ground_truth['value'].values, gt_rows),
+                       'value_sim': take(simulation['value'].values, sim_rows)},
+                      columns=[c if c != 'value' else 'value_gt' for c in ground_truth.columns] + ['value_sim']).fillna(fill_value)
 
     return(df)
 
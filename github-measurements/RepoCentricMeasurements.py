@@ -6,6 +6,7 @@ from multiprocessing import Pool
 from functools import partial
 from pathos import pools as pp
 from multiprocessing import Pool
+from GroupIndex import GroupIndex, meanInterEventTime
 
 '''
 This class implements repo centric methods.
@@ -18,20 +19,17 @@ class RepoCentricMeasurements(object):
 
 
     '''
-    This function creates a dictionary of data frames with
+    This function creates a dictionary-like index of data frames with
     each entry being the activity of one repo from the repos
-    argument.
+    argument.  The events of all repos are gathered in a single pass
+    and each repo's data frame is a slice of the index (see GroupIndex.py).
 
     This is used for the selected repos for the node-level meausurements. 
     Inputs: repos - List of repo ids (full_name_h)
-    Output: Dictionary of data frames with the repo ids as the keys
+    Output: GroupIndex of data frames with the repo ids as the keys
     '''
     def getSelectRepos(self, repos):
-        reposDic = {}
-        for ele in repos:
-            d = self.main_df[self.main_df['repo'] == ele]
-            reposDic[ele] = d
-        return reposDic
+        return GroupIndex(self.main_df, 'repo', self.encode('repo', repos), labels=repos, missing=-1 if self.vocab is not None else None)
 
     '''
     This function runs a particular measurement (method) on the
@@ -46,8 +44,7 @@ class RepoCentricMeasurements(object):
 
         ans = {}
         for ele in self.selectedRepos.keys():
-            df = self.selectedRepos[ele].copy()
-            ans[ele] = method(df,*args)
+            ans[ele] = method(self.selectedRepos[ele],*args)
         return ans
 
 
@@ -79,7 +76,7 @@ class RepoCentricMeasurements(object):
     def getRepoDiffusionDelayHelper(self, df, eventType=None, unit='h'):
 
         if eventType != None:
-            df = df[df.event.isin(eventType)]
+            df = df[df.event.isin(self.encode('event', eventType))]
             
 
         if len(df.index) == 0: 
@@ -128,7 +125,7 @@ class RepoCentricMeasurements(object):
     def getRepoGrowthHelper(self, df, eventType=None, cumSum=False):
 
         if eventType != None:
-             df = df[df.event.isin(eventType)]
+             df = df[df.event.isin(self.encode('event', eventType))]
 
         df = df.set_index("time")
 
@@ -188,7 +185,7 @@ class RepoCentricMeasurements(object):
             return p
 
         if eventType != None:
-            df = df[df.event.isin(eventType)]
+            df = df[df.event.isin(self.encode('event', eventType))]
 
         df = df.set_index("time")
 
@@ -235,7 +232,7 @@ class RepoCentricMeasurements(object):
         counts = df.groupby(['event',col])['user'].count().reset_index()
         counts.columns = ['event',col,'value']
 
-        return counts
+        return self.decodeResult(counts)
 
     '''
     Helper Function for getting the Dist. of Events per weekday.
@@ -287,7 +284,7 @@ class RepoCentricMeasurements(object):
     def getGiniCoefHelper(self, df, nodeType,eventType):
 
         if eventType is not None:
-            df = df[df.event.isin(eventType)]
+            df = df[df.event.isin(self.encode('event', eventType))]
 
         #count events for given node type
         df = df[['repo', 'user']].groupby(nodeType).count()
@@ -330,7 +327,7 @@ class RepoCentricMeasurements(object):
     def getPalmaCoefHelper(self, df, nodeType='repo', eventType=None):
 
         if eventType is not None:
-            df = df[df.event.isin(eventType)]
+            df = df[df.event.isin(self.encode('event', eventType))]
 
         df = df[['repo', 'user']].groupby(nodeType).count()
 
@@ -364,11 +361,11 @@ class RepoCentricMeasurements(object):
     '''
     def getTopKRepos(self,k=100,eventType=['WatchEvent']):
         df = self.main_df
-        df = df[df.event.isin(eventType)]
-        p = df[['repo', 'event']].groupby(['repo']).count()
+        df = df[df.event.isin(self.encode('event', eventType))]
+        p = self.sortIds(df[['repo', 'event']].groupby(['repo']).count())
         p = p.sort_values(by='event',ascending=False)
         p.columns = ['value']
-        return p.head(k)
+        return self.decodeResult(p.head(k))
 
 
     '''
@@ -383,17 +380,17 @@ class RepoCentricMeasurements(object):
 
         df = self.main_df
         if eventType != None:
-            df = df[df['event'].isin(eventType)]
+            df = df[df['event'].isin(self.encode('event', eventType))]
 
         p = df[['repo','time']].groupby('repo').count()
         p = p.sort_values(by='time')
         p.columns = ['value']
         p = p.reset_index()
-        return p
+        return self.decodeResult(p)
 
     '''
     A wrapper function to calculate the average time between events for each repo
-    NOTE: Multithreading is highly recommended for datasets with more than 5000 repos.
+    The averages of all repos are computed in one pass (see meanInterEventTime in GroupIndex.py).
     Question #11
     Inputs: repos - (Optional) Boolean to use selected repo nodes.  If False, calculate for all repos.
             eventType - List of event type(s) to get distribution over
@@ -404,26 +401,15 @@ class RepoCentricMeasurements(object):
         df = self.main_df
 
         if eventType != None:
-            df = df[df.event.isin(eventType)]
+            df = df[df.event.isin(self.encode('event', eventType))]
 
         if repos:
             repo_list = self.selectedRepos.keys()
-            df = df[df.repo.isin(repo_list)]
+            df = df[df.repo.isin(self.encode('repo', repo_list))]
 
-        deltas = df.groupby('repo')['time'].apply(self.getMeanTimeHelper)
-
-        return deltas
-
-    '''
-    Calculates the average time between events for each repo
-    Question #12
-    Inputs:  times - A Series containing the event times for an individual repo
-    Outputs: Average time between events for the repo in hours
-    '''
-    def getMeanTimeHelper(self, times):
-        delta = np.mean(times.diff()) / np.timedelta64(1, 'h')
-        return delta
+        deltas = meanInterEventTime(df, 'repo', unit='h')
 
+        return self.decodeResult(deltas)
 
     '''
     Calculate the proportion of pull requests that are accepted for each repo.
@@ -437,9 +423,9 @@ class RepoCentricMeasurements(object):
         df = self.main_df_opt
 
         #check if optional columns exist
-        if not df is None and 'PullRequestEvent' in self.main_df.event.values:
-            df = df[self.main_df.event.isin(eventType)]
-            users_repos = self.main_df[self.main_df.event.isin(eventType)]
+        if not df is None and self.encode('event', 'PullRequestEvent') in self.main_df.event.values:
+            df = df[self.main_df.event.isin(self.encode('event', eventType))]
+            users_repos = self.main_df[self.main_df.event.isin(self.encode('event', eventType))]
 
             #subset to only pull requests which are being closed (not opened)
             idx = df['action'] == 'closed'
@@ -448,7 +434,7 @@ class RepoCentricMeasurements(object):
 
             #merge optional columns (action, merged) with the main data frame columns
             closes = pd.concat([users_repos,closes],axis=1)
-            closes = closes[['repo','merged']]
+            closes = self.decode(closes[['repo','merged']])
             closes['value'] = 1
 
             #create count of accepted (merged) and rejected pull requests by repo
@@ -485,12 +471,12 @@ class RepoCentricMeasurements(object):
         if selectedRepos == True:
             return self.runSelectRepos(self.getIssueVsPushProbabilityHelper,eventType)
         else:
-            return self.getIssueVsPushProbability(self.main_df,eventType)
+            return self.getIssueVsPushProbabilityHelper(self.main_df,eventType)
 
     def getIssueVsPushProbabilityHelper(self,df,eventType):
 
         if eventType != None:
-            df = df[df['event'].isin(eventType)]
+            df = df[df['event'].isin(self.encode('event', eventType))]
 
         df['value'] = 1
 
@@ -505,14 +491,17 @@ class RepoCentricMeasurements(object):
 
         measurement = df.groupby(['repo','user']).apply(user_repo_cumulative_count).reset_index()
 
-        if self.previous_event_counts != None:
+        if self.previous_event_counts is not None:
             measurement = measurement.merge(self.previous_event_counts,on=['user','repo'],how='left').fillna(0)
             measurement['value'] = measurement['value'] + measurement['count']
 
-        measurement = measurement[measurement['event'].isin(['IssuesEvent','PushEvent'])]
+        issue_event = self.encode('event', 'IssuesEvent')
+        push_event = self.encode('event', 'PushEvent')
+
+        measurement = measurement[measurement['event'].isin([issue_event,push_event])]
 
-        measurement['issue'] = measurement['event'] == 'IssuesEvent'
-        measurement['push'] = measurement['event'] == 'PushEvent'
+        measurement['issue'] = measurement['event'] == issue_event
+        measurement['push'] = measurement['event'] == push_event
 
 
         measurement['next_event_issue'] = measurement['issue'].shift(-1)
@@ -533,6 +522,7 @@ class RepoCentricMeasurements(object):
         if len(measurement.index) > 0:
             measurement = measurement.groupby(['repo','num_events_binned']).apply(ratio).reset_index()
             measurement.columns = ['repo','num_events_binned','value']
+            measurement = self.decodeResult(measurement)
         else:
             measurement = None
 
@@ -549,7 +539,7 @@ class RepoCentricMeasurements(object):
     def propUserContinueHelper(self,df,eventType):
         
         if not eventType is None:            
-            data = df[df['event'].isin(eventType)]
+            data = df[df['event'].isin(self.encode('event', eventType))]
 
 
         if len(data.index) > 1:
@@ -570,6 +560,7 @@ class RepoCentricMeasurements(object):
             measurement['last_event'] = ~measurement['last_event']
             measurement = measurement.groupby(['repo','num_actions']).last_event.mean().reset_index()
             measurement.columns = ['repo','num_actions','value']
+            measurement = self.decodeResult(measurement)
         else:
             measurement = None
 
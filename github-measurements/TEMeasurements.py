@@ -11,12 +11,45 @@ computeTERepos
 
 Note computeTEUsersEvents requires TEUsers to have been ran. If computeTEUserEvents is called then it will calculate the computeTEUsers automatically. 
 
+The results of each TE configuration are stored on the object (see getTEResultKey), so calling a function again,
+or computeTEUsers after computeTEUserEvents, does not recompute the TE.
+
 '''
 import numpy as np
-import pandas as pd
 from collections import defaultdict
-import jpype
 import pickle as pkl
+import sys
+import multiprocessing as mp
+from multiprocessing import cpu_count
+from pathos import pools as pp
+from pathos.helpers import mp as pathos_mp
+from GroupIndex import splitSeries, gatherSeries, GroupSeries
+from BinaryTE import BinarySeries, seriesMatrix, binaryTE, binaryTESignificance, allPairsStateCounts, teFromCounts, teZScores, teZScoresSequential, teUpperBounds, topK, groupSeed, pairSeed
+
+try:
+    #the JVM is only needed for the JIDT TE engine (teEngine='jidt')
+    import jpype
+except ImportError:
+    jpype = None
+
+#inputs of the groups computed by the worker processes of createAllTEMatrices.  They are set before the
+#workers are forked, so the workers inherit the binned series instead of receiving a pickled copy.
+_te_inputs = {}
+
+
+def _teGroupWorker(repo):
+    """
+    Compute the top edges and nodes of one repo (repo group) from the inputs inherited from createAllTEMatrices
+    """
+
+    measurements = _te_inputs["measurements"]
+    print("Computing for repo (repo group) : ", repo)
+    edges, nodes = measurements.getTESigPairsRepo(_te_inputs["src"][repo], _te_inputs["dest"][repo], *_te_inputs["args"], group=repo)
+    surrogates = dict((key, n) for key, n in measurements.te_surrogates.items() if key[0] == repo)
+
+    return edges, nodes, surrogates, measurements.te_prune_stats.get(repo)
+
+
 class TEMeasurements():
     def __init__(object):
         super(TE, self).__init__()
@@ -34,65 +67,136 @@ class TEMeasurements():
       
     def computeBasicStats(self,timeseries):
 
+        if isinstance(timeseries, GroupSeries):
+            return timeseries.maxTime()
+
         maxTime = 0.0
         for repo,actorsTS in timeseries.iteritems():
             maxTime = max(maxTime,max({key: max(value) for key, value in timeseries[repo].items()}.values()))
 
         return maxTime 
     
-    def getTESigPairsRepo(self,actorTSSrc,actorTSDest,teThresh, delayUnits, nReps, kE, kN):
+    def getTESigPairsRepo(self,actorTSSrc,actorTSDest,teThresh, delayUnits, nReps, kE, kN, group=None):
 
-        actorsSrc = actorTSSrc.keys()
-        actorsDest = actorTSDest.keys()
-
-        tSSrc = actorTSSrc.values()
-        tSDest = actorTSDest.values()
+        actorsSrc = list(actorTSSrc.keys())
+        actorsDest = list(actorTSDest.keys())
 
         nActSrc = len(actorsSrc)
         nActDest = len(actorsDest)
 
         print("Number of source / destination actors (repos) in this repo (repo group ) : ", nActSrc, " ", nActDest)
 
-        allEdges = {}
-        allNodes = {}
-
-        for idxS in range(nActSrc):
-
-            src = tSSrc[idxS]
-            nodeTEVal = 0.0
-
-            for idxD in range(nActDest):
-
-                if (actorsSrc[idxS] != actorsDest[idxD]):
-
-                    dest = tSDest[idxD]
-                    TEDelays = np.zeros((len(delayUnits)))
-
-                    for idx in range(len(delayUnits)):
-                        TEDelays[idx] = self.getTETimeSeriesPairBinary(src, dest, teThresh, delayUnits[idx], nReps)
-
-                    if (np.max(TEDelays) > 0.0):
-                        allEdges[tuple((actorsSrc[idxS],actorsDest[idxD]))] = np.max(TEDelays)
-                        nodeTEVal = nodeTEVal + np.max(TEDelays)
-
-            if (nodeTEVal > 0.0):
-                allNodes[actorsSrc[idxS]] = nodeTEVal
-
-        # topEdges = sorted(allEdges.items(), key=lambda (k,v): v, reverse = True)
-        topEdges = sorted(allEdges.items(), key=lambda kv: kv[1], reverse = True)
-        
-        if (len(topEdges) > kE):
-            topEdges = topEdges[:kE]
-
-        # topNodes = sorted(allNodes.items(), key=lambda (k,v): v, reverse = True)
-        topNodes = sorted(allNodes.items(), key=lambda kv: kv[1], reverse = True)
-        if (len(topNodes) > kN):
-            topNodes = topNodes[:kN]
+        #maximum significant TE over the delays of each (source, destination) pair
+        if self.teEngine == 'numpy':
+            teMax = self.getTESigMatrixNumpy(actorTSSrc, actorTSDest, teThresh, delayUnits, nReps, group)
+        else:
+            teMax = np.zeros((nActSrc, nActDest))
+            for idxS in range(nActSrc):
+                for idxD in range(nActDest):
+                    if (actorsSrc[idxS] != actorsDest[idxD]):
+                        for delay in delayUnits:
+                            te = self.getTETimeSeriesPairBinary(actorTSSrc[actorsSrc[idxS]], actorTSDest[actorsDest[idxD]], teThresh, delay, nReps)
+                            teMax[idxS, idxD] = max(teMax[idxS, idxD], te)
+
+        #the top kE edges and kN nodes are selected without sorting all edges and nodes, in the order of a stable
+        #sort of the edges (source by source) and nodes by decreasing TE
+        edgeTE = teMax.ravel()
+        edges = np.flatnonzero(edgeTE > 0.0)
+        edges = edges[topK(edgeTE[edges], kE)]
+        topEdges = [((actorsSrc[idx // nActDest], actorsDest[idx % nActDest]), edgeTE[idx]) for idx in edges]
+
+        #cumsum adds the TE of the edges of a node one by one, in destination order
+        nodeTE = np.cumsum(teMax, axis=1)[:, -1] if nActDest > 0 else np.zeros(nActSrc)
+        nodes = np.flatnonzero(nodeTE > 0.0)
+        nodes = nodes[topK(nodeTE[nodes], kN)]
+        topNodes = [(actorsSrc[idx], nodeTE[idx]) for idx in nodes]
         
         return (topEdges, topNodes)
 
+    '''
+    Compute the TE of all (source, destination) pairs of a repo (repo group) at once (see allPairsTE in BinaryTE.py).
+    Inputs: actorTSSrc, actorTSDest - Dictionaries of binned binary time series of the source and destination actors
+            teThresh, delayUnits, nReps - TE threshold, delays and number of surrogates of the significance test
+            group - (Optional) Repo (repo group) of the actors, used as a key of the surrogate counts
+    With self.teSequential each pair only draws surrogates until it is settled as not significant (see teZScoresSequential
+    in BinaryTE.py), and the number of surrogates used by each tested (group, source, destination, delay) is recorded
+    in self.te_surrogates.
+    Sources and destinations which cannot reach teThresh (see teUpperBounds in BinaryTE.py) are left out of the
+    computation.  The number of pairs whose TE is not computed and of sources and destinations pruned is recorded in
+    self.te_prune_stats.  Pruned pairs are below teThresh, so no significance tests are skipped.
+    Output: Array (sources x destinations) of the maximum over the delays of the significant TE of each pair.
+            Pairs of an actor with itself and pairs which are not significant are 0.
+    '''
+    def getTESigMatrixNumpy(self,actorTSSrc,actorTSDest,teThresh, delayUnits, nReps, group=None):
+
+        actorsSrc = list(actorTSSrc.keys())
+        actorsDest = list(actorTSDest.keys())
+
+        if len(actorsSrc) == 0 or len(actorsDest) == 0:
+            return np.zeros((len(actorsSrc), len(actorsDest)))
+
+        src = seriesMatrix(actorTSSrc)
+        dest = seriesMatrix(actorTSDest)
+
+        selfPairs = np.zeros((len(actorsSrc), len(actorsDest)), dtype=bool)
+        destPositions = dict(zip(actorsDest, range(len(actorsDest))))
+        for idxS, actor in enumerate(actorsSrc):
+            if actor in destPositions:
+                selfPairs[idxS, destPositions[actor]] = True
+
+        #surrogates are drawn from a generator seeded for each group so results are reproducible
+        #and do not depend on the order in which the groups are processed
+        rng = np.random.RandomState(groupSeed(self.teSeed, group))
+
+        #sources and destinations whose TE upper bound is below the threshold at every delay cannot have a
+        #significant pair, so they are dropped before the TE is computed (the margin covers rounding errors)
+        srcBounds, destBounds = teUpperBounds(src, dest, delayUnits)
+        limit = teThresh * (1 - 1e-9)
+        keepSrc = np.flatnonzero((srcBounds >= limit).any(axis=1))
+        keepDest = np.flatnonzero((destBounds >= limit).any(axis=1))
+
+        #only the pairs of a dropped source or destination are left out of the computation
+        computed = np.zeros(selfPairs.shape, dtype=bool)
+        computed[np.ix_(keepSrc, keepDest)] = True
+        pairs = int((~selfPairs).sum())
+        pruned = int((~computed & ~selfPairs).sum())
+        self.te_prune_stats[group] = {'pairs': pairs, 'pruned pairs': pruned,
+                                      'pruned sources': len(actorsSrc) - len(keepSrc), 'pruned destinations': len(actorsDest) - len(keepDest)}
+        print("Pairs pruned by the TE bounds : ", pruned, " of ", pairs)
+
+        src = src[keepSrc]
+        dest = dest[keepDest]
+        selfPairs = selfPairs[np.ix_(keepSrc, keepDest)]
+
+        te = np.zeros((len(actorsSrc), len(actorsDest), len(delayUnits)))
+        teKept = np.zeros((len(keepSrc), len(keepDest), len(delayUnits)))
+        for idx, delay in enumerate(delayUnits):
+            counts = allPairsStateCounts(src, dest, delay)
+            teDelay = teFromCounts(counts)
+            teDelay[selfPairs] = 0.0
+
+            #significance test of all pairs above the threshold in one batch
+            candidates = teDelay > teThresh
+            if self.teSequential:
+                z_scores, used = teZScoresSequential(counts[candidates], nReps, rng)
+            else:
+                z_scores = teZScores(counts[candidates], nReps, rng)
+                used = np.full(len(z_scores), nReps)
+
+            for idxS, idxD, n in zip(*(np.nonzero(candidates) + (used,))):
+                self.te_surrogates[(group, actorsSrc[keepSrc[idxS]], actorsDest[keepDest[idxD]], delay)] = n
+            teKept[candidates, idx] = np.where(z_scores < 3.0, 0.0, teDelay[candidates])
+
+        te[np.ix_(keepSrc, keepDest)] = teKept
+
+        return te.max(axis=2)
+
     def getTETimeSeriesPairBinary(self,src, dest, teThresh, delayParam, nReps):
 
+        if self.teEngine == 'numpy':
+            return self.getTETimeSeriesPairBinaryNumpy(src, dest, teThresh, delayParam, nReps)
+
+        self.startJVM()
         teCalcClass = jpype.JPackage("infodynamics.measures.discrete").TransferEntropyCalculatorDiscrete
         teCalc = teCalcClass(2,1,1,1,1,delayParam)
         teCalc.initialise()
@@ -111,93 +215,207 @@ class TEMeasurements():
             te = 0.0   
 
         return te
+
+    '''
+    NumPy version of getTETimeSeriesPairBinary (see BinaryTE.py), which computes the same TE without
+    creating a JIDT calculator through the JVM for every pair and delay.
+    '''
+    def getTETimeSeriesPairBinaryNumpy(self,src, dest, teThresh, delayParam, nReps):
+
+        te = binaryTE(src, dest, delayParam)
+
+        if(te > teThresh):
+            #the permutations are drawn from a generator seeded from teSeed and the pair, as in getTESigMatrixNumpy
+            rng = np.random.RandomState(pairSeed(self.teSeed, src, dest, delayParam))
+            te, teNullMean, teNullStd = binaryTESignificance(src, dest, delayParam, nReps, rng)
+            z_score = (te-teNullMean)/teNullStd
+
+            if (z_score < 3.0):
+                te = 0.0
+        else:
+            te = 0.0
+
+        return te
     
     '''
     For TE Users
     '''
     def getTimeSeriesUsers(self):
         
-        df = self.main_df[self.main_df['repo'].isin(self.repo_actors.keys())]
-        timeseries = dict()
-        for repo in self.repo_actors.keys():
-            tempdf = df[df['repo'] == repo]
-            if (not tempdf.empty):
-                tempdf = df[df['user'].isin(self.repo_actors[repo])]
-                if (not tempdf.empty):
-                    tempdf['time'] = pd.to_datetime(tempdf['time'])
-                    tempdf['time'] = (tempdf['time'] - self.startTime).astype('timedelta64[s]')
-                    tempDic = tempdf[['user','time']].groupby('user')['time'].apply(list).to_dict()
+        repos = list(self.repo_actors.keys())
+        df = self.main_df[self.main_df['repo'].isin(self.encode('repo', repos))]
+        activeRepos = set(df['repo'].unique())
+
+        #as before, the series of a user include its events in all the repos of repo_actors
+        groups = [(repo, self.repo_actors[repo]) for repo in repos if self.encode('repo', repo) in activeRepos]
+
+        return self.getGroupSeries(df, groups, ['user'])
+
+    '''
+    Split the events into the time series of the actors of each group in one pass (see splitSeries and GroupSeries in GroupIndex.py).
+    Inputs: df - Data frame of the events of all groups
+            groups - List of (group, list of actor ids) pairs
+            columns - Key columns of the series, starting with the actor column (e.g. ['user'] or ['user','event'])
+    Output: GroupSeries with the keys (group, actor, ...) and the times in seconds since self.startTime of the actors of
+            each group which have events, ordered by actor id.  Groups without any such actor are left out.
+    '''
+    def getGroupSeries(self,df,groups,columns):
+
+        keys, offsets, values = splitSeries(df, columns, self.startTime)
+        if len(keys) == 0:
+            return GroupSeries([], [0], [])
 
-                    timeseries[repo] = tempDic
+        decodedKeys = list(zip(*[np.asarray(self.decodeValues(column, np.array([key[i] for key in keys]))).tolist()
+                                 for i, column in enumerate(columns)]))
 
-        return timeseries
+        actorRows = defaultdict(list)
+        for row, key in enumerate(keys):
+            actorRows[key[0]].append(row)
 
+        seriesKeys = []
+        rows = []
+        for group, actors in groups:
+            #the series are ordered by the decoded keys, so that encoded and plain runs order the actors (and assign
+            #their seeds and matrix positions) alike
+            members = sorted((row for actor in set(self.encode(columns[0], list(actors))) for row in actorRows.get(actor, [])),
+                             key=lambda row: decodedKeys[row])
+            seriesKeys.extend((group,) + tuple(decodedKeys[row]) for row in members)
+            rows.extend(members)
 
+        offsets, values = gatherSeries(offsets, values, rows)
 
+        return GroupSeries(seriesKeys, offsets, values)
+
+
+
+    '''
+    Bin the event times of the actors of each group into bit-packed binary series (see BinarySeries in BinaryTE.py).
+    The input is a GroupSeries or a dictionary of dictionaries of the times of the actors of each group.
+    The times of all actors of a group are binned with one scatter.  Times outside of [0, totalBins * binSize) are ignored.
+    '''
     def getBinnedBinaryTimeSeries(self,groupEntityTS,binSize,totalBins):
 
         binnedTS = defaultdict(dict)
 
-        for group,entityTS in groupEntityTS.iteritems():
-            entitiesBinnedTS = {}
-            for entity, timeSeries in entityTS.iteritems(): 
-                entitiesBinnedTS[entity] = self.getBinnedTimeSeriesBinarySingle(totalBins, binSize, timeSeries)
+        if isinstance(groupEntityTS, GroupSeries):
+            lengths = groupEntityTS.lengths()
+            for group in groupEntityTS.groups():
+                first, last = groupEntityTS.groupRange(group)
+                entities = [key[1] for key in groupEntityTS.labels[first:last]]
+                rows = np.repeat(np.arange(last - first), lengths[first:last])
+                bins = groupEntityTS.values[groupEntityTS.offsets[first]:groupEntityTS.offsets[last]] // int(binSize)
+
+                binnedTS[group] = BinarySeries(entities, rows, bins, totalBins)
 
-            binnedTS[group] = entitiesBinnedTS
+            return binnedTS
+
+        for group,entityTS in groupEntityTS.items():
+            entities = list(entityTS.keys())
+            timeSeries = [np.asarray(entityTS[entity], dtype=np.float64) for entity in entities]
+            lengths = [len(ts) for ts in timeSeries]
+
+            rows = np.repeat(np.arange(len(entities)), lengths)
+            bins = np.floor(np.concatenate(timeSeries + [np.zeros(0)]) / binSize).astype(np.int64)
+
+            binnedTS[group] = BinarySeries(entities, rows, bins, totalBins)
 
         return binnedTS
 
     def getBinnedTimeSeriesBinarySingle(self,totalBins,binSize,timeSeries):
 
-        tsBinned = np.zeros((totalBins), dtype=int)
-        for timeVal in timeSeries:
-            try:
-                idx = (timeVal // binSize)
-                tsBinned[int(idx)] = 1    
-            except:
-                continue
-
-        return tsBinned
+        return BinarySeries([0], np.zeros(len(timeSeries)), np.floor(np.asarray(timeSeries, dtype=np.float64) / binSize), totalBins)[0]
     
 
+    '''
+    Compute the top edges and nodes of every repo (repo group).
+    The groups are independent, so with more than one group and self.teCPU != 1 they are computed in parallel worker
+    processes (self.teCPU workers, all cores if None).  The workers are forked with the binned series of all groups,
+    only the group ids and the results are passed between processes, and each worker starts its own JVM if the JIDT
+    engine is used.  The results are the same as for a sequential run.
+    '''
     def createAllTEMatrices(self,rATSrc, rATDest, teThresh, delayUnits, nReps, kE, kN):
 
         if (set(rATSrc.keys()) != set(rATDest.keys())):
             sys.exit("The repos in the source and target time series data structure is different. Please check.")
 
-        topEdges = defaultdict(dict)
-        topNodes = {}
+        repos = list(rATSrc.keys())
+
+        nCPU = self.teCPU if self.teCPU is not None else cpu_count()
+        nCPU = min(nCPU, len(repos))
 
-        for repo in rATSrc.keys():
+        #workers of a process pool cannot start processes themselves, and a JVM does not survive a fork
+        if mp.current_process().daemon or pathos_mp.current_process().daemon or (jpype is not None and jpype.isJVMStarted()):
+            nCPU = 1
+
+        if nCPU > 1:
+            _te_inputs.update(measurements=self, src=rATSrc, dest=rATDest, args=(teThresh, delayUnits, nReps, kE, kN))
+            try:
+                pool = pp.ProcessPool(nCPU)
+                #drop any cached workers forked before the inputs were set
+                pool.clear()
+                results = pool.map(_teGroupWorker, repos)
+                pool.close()
+                pool.join()
+                pool.clear()
+            finally:
+                _te_inputs.clear()
+        else:
+            results = []
+            for repo in repos:
+                print("Computing for repo (repo group) : ", repo)
+                edges,nodes  = self.getTESigPairsRepo(rATSrc[repo],rATDest[repo],teThresh,delayUnits, nReps, kE, kN, group=repo)
+                results.append((edges, nodes, {}, self.te_prune_stats.get(repo)))
 
-            print("Computing for repo (repo group) : ", repo)
-            edges,nodes  = self.getTESigPairsRepo(rATSrc[repo],rATDest[repo],teThresh,delayUnits, nReps, kE, kN) 
+        topEdges = defaultdict(dict)
+        topNodes = {}
 
+        for repo, (edges, nodes, surrogates, pruneStats) in zip(repos, results):
             topEdges[repo] = edges
-            topNodes[repo] = nodes            
+            topNodes[repo] = nodes
+            self.te_surrogates.update(surrogates)
+            if pruneStats is not None:
+                self.te_prune_stats[repo] = pruneStats
 
         return (topEdges, topNodes)
 
 
 
+    '''
+    TE results are stored in self.te_results, keyed by the TE measurement and every parameter which changes its result,
+    so each distinct TE configuration is computed once per data set however many measurements use it.
+    '''
+    def getTEResultKey(self,name,*args):
+        return (name, self.binSize, tuple(self.teThresh), tuple(self.delayUnits), self.nReps, self.kE, self.kN,
+                self.startTime, self.starEvent, tuple(self.otherEvents), self.teEngine, self.teSeed, self.teSequential) + args
+
     #main function to call
     def computeTEUsers(self):
-        #if not jpype.isJVMStarted():
-        #    jpype.startJVM(jpype.getDefaultJVMPath(), "-ea", "-Djava.class.path=" + "../infodynamics.jar")
-        repoActorsTS = self.getTimeSeriesUsers()
 
-        maxTime = self.computeBasicStats(repoActorsTS)
-        totalBins = int(np.ceil(maxTime/float(self.binSize)))
+        key = self.getTEResultKey('computeTEUsers')
+        if key not in self.te_results:
+            repoActorsTS = self.getTimeSeriesUsers()
+
+            maxTime = self.computeBasicStats(repoActorsTS)
+            totalBins = int(np.ceil(maxTime/float(self.binSize)))
+
+            repoActorsBinned = self.getBinnedBinaryTimeSeries(repoActorsTS, self.binSize, totalBins)
 
-        repoActorsBinned = self.getBinnedBinaryTimeSeries(repoActorsTS, self.binSize, totalBins)
+            self.te_results[key] = self.createAllTEMatrices(repoActorsBinned, repoActorsBinned, self.teThresh[0], self.delayUnits, nReps = self.nReps, kE=self.kE, kN=self.kN) 
 
-        topEdges, topNodes = self.createAllTEMatrices(repoActorsBinned, repoActorsBinned, self.teThresh[0], self.delayUnits, nReps = self.nReps, kE=self.kE, kN=self.kN) 
-        #jpype.shutdownJVM()
+        topEdges, topNodes = self.te_results[key]
         self.top_edges = topEdges
         self.top_users = topNodes
-        #with open('top_users.pkl','w') as handle:
-        #    pkl.dump(allDic,handle)
         return topEdges, topNodes  
+
+    '''
+    Restore the results of computeTEUsers from its output (e.g. loaded from a MeasurementCache), so that
+    computeTEUserEvents uses its top users as the rockstars instead of computing the TE of the users again.
+    Input: result - Output (topEdges, topNodes) of computeTEUsers with the current TE parameters
+    '''
+    def restoreTEUsers(self, result):
+
+        self.te_results[self.getTEResultKey('computeTEUsers')] = result
+        self.top_edges, self.top_users = result
     
     
   
@@ -205,111 +423,83 @@ class TEMeasurements():
     '''
     Compute TEUSerEvents
     '''
-    def createAllTEMatrices(self, rATSrc, rATDest, teThresh, delayUnits, nReps, kE, kN):
-    
-        if (set(rATSrc.keys()) != set(rATDest.keys())):
-            sys.exit("The repos in the source and target time series data structure is different. Please check.")
-
-        topEdges = defaultdict(dict)
-        topNodes = {}
-
-        for repo in rATSrc.keys():
-
-            print("Computing for repo (repo group) : ", repo)
-            edges,nodes  = self.getTESigPairsRepo(rATSrc[repo],rATDest[repo],teThresh,delayUnits, nReps, kE, kN) 
-           
-            topEdges[repo] = edges
-            topNodes[repo] = nodes            
-
-        return (topEdges, topNodes)
-    
     def getSourceTargetUserEventTS(self,repoActorEventsTS,repoRockstars, rockStarEvent, otherEvents):
     
-        repoActorsSRC = defaultdict(dict)
-        repoActorsTAR  = defaultdict(dict)
-        reposConsidered = repoRockstars.keys()
+        reposConsidered = set(repoRockstars.keys())
+        lengths = repoActorEventsTS.lengths()
 
-        #First the rockstars who will act as sources
-        for repo,actorEventTS in repoActorEventsTS.iteritems():
-            if (repo in reposConsidered):
-                rockStars = [x[0] for x in repoRockstars[repo]]
-                for actor,eventTS in actorEventTS.iteritems():
-                    if ((actor in rockStars) and (rockStarEvent in eventTS.keys())):
-                        if (len(eventTS[rockStarEvent]) > 20):
-                            repoActorsSRC[repo][actor] = eventTS[rockStarEvent]
-
-        #The other users who form the targets
-        for repo,actorEventTS in repoActorEventsTS.iteritems():
-            if (repo in reposConsidered):
-                rockStars = [x[0] for x in repoRockstars[repo]]
-                for actor,eventTS in actorEventTS.iteritems():
-                    if (actor not in rockStars):
-                        combinedEvent = []
-                        for event in otherEvents:
-                            if (event in eventTS.keys()):
-                                combinedEvent = combinedEvent + eventTS[event]
-                        if (len(combinedEvent) > 20):
-                            repoActorsTAR[repo][actor] = combinedEvent
+        srcKeys = []
+        srcRows = []
+        tarKeys = []
+        tarRows = []
+        tarCounts = []
 
+        for repo in repoActorEventsTS.groups():
+            if (repo in reposConsidered):
+                rockStars = set(x[0] for x in repoRockstars[repo])
+                first, last = repoActorEventsTS.groupRange(repo)
+
+                #the event series of each actor of the repo
+                actorEvents = defaultdict(dict)
+                for row in range(first, last):
+                    group, actor, event = repoActorEventsTS.labels[row]
+                    actorEvents[actor][event] = row
+
+                for actor, eventRows in actorEvents.items():
+                    #First the rockstars who will act as sources
+                    if (actor in rockStars):
+                        if ((rockStarEvent in eventRows) and (lengths[eventRows[rockStarEvent]] > 20)):
+                            srcKeys.append((repo, actor))
+                            srcRows.append(eventRows[rockStarEvent])
+                    #The other users who form the targets, with their events combined
+                    else:
+                        rows = [eventRows[event] for event in otherEvents if event in eventRows]
+                        if (lengths[rows].sum() > 20):
+                            tarKeys.append((repo, actor))
+                            tarRows.extend(rows)
+                            tarCounts.append(len(rows))
 
         #Ensure that both SRC and TAR contain exactly the same repos since filtering criteria are different
-        srcKeys = repoActorsSRC.keys()
-        tarKeys = repoActorsTAR.keys()
-        differenceKeys = []
-        if (len(srcKeys) > len(tarKeys)):
-            differenceKeys = list(set(srcKeys).difference(set(tarKeys)))
-            for diffkey in differenceKeys:
-                del repoActorsSRC[diffkey]       
-        elif (len(tarKeys) > len(srcKeys)):
-            differenceKeys = list(set(tarKeys).difference(set(srcKeys)))
-            for diffkey in differenceKeys:
-                    del repoActorsTAR[diffkey]                          
+        repos = set(key[0] for key in srcKeys) & set(key[0] for key in tarKeys)
 
+        srcSelect = [i for i, key in enumerate(srcKeys) if key[0] in repos]
+        offsets, values = gatherSeries(repoActorEventsTS.offsets, repoActorEventsTS.values, np.array(srcRows, dtype=np.int64)[srcSelect])
+        repoActorsSRC = GroupSeries([srcKeys[i] for i in srcSelect], offsets, values)
+
+        tarSelect = [i for i, key in enumerate(tarKeys) if key[0] in repos]
+        tarStarts = np.concatenate([[0], np.cumsum(tarCounts)]).astype(np.int64)
+        rows = [row for i in tarSelect for row in tarRows[tarStarts[i]:tarStarts[i + 1]]]
+        offsets, values = gatherSeries(repoActorEventsTS.offsets, repoActorEventsTS.values, rows, [tarCounts[i] for i in tarSelect])
+        repoActorsTAR = GroupSeries([tarKeys[i] for i in tarSelect], offsets, values)
 
         return (repoActorsSRC, repoActorsTAR)
     
     
     def getTimeSeriesUsersEvents(self,df,repoActors):
         
-        df = df[df['repo'].isin(repoActors.keys())]
-
-        timeseries = dict()
-        for repo in repoActors.keys():
-            tempdf = df[df['repo'] == repo]
-
-            if len(tempdf) == 0:
-                timeseries[repo] = dict()
-                continue
-            tempdf = df[df['user'].isin(repoActors[repo])]
+        repos = list(repoActors.keys())
+        df = df[df['repo'].isin(self.encode('repo', repos))]
+        activeRepos = set(df['repo'].unique())
 
-            if len(tempdf) == 0:
-                timeseries[repo] = dict()
-                continue
+        #as before, the series of a user include its events in all the repos of repoActors
+        groups = [(repo, repoActors[repo]) for repo in repos if self.encode('repo', repo) in activeRepos]
 
-            tempdf['time'] = pd.to_datetime(tempdf['time'])
-            tempdf['time'] = (tempdf['time'] - self.startTime).astype('timedelta64[s]')
-        
-            tempdf = pd.DataFrame(tempdf[['user','event','time']].groupby(['user','event'])['time'].apply(list))
-
-            tempdf = tempdf.reset_index()
-            tempdic = dict()
-
-            for ele in tempdf['user'].unique():
-                tm = dict()
-                curdf = tempdf[tempdf['user'] == ele]
-                for eventT in curdf['event'].unique():
-                    tm[eventT] = curdf[curdf['event'] == eventT]['time'].values[0]
-                tempdic[ele] = tm
-            timeseries[repo] = tempdic
-        return timeseries
+        return self.getGroupSeries(df, groups, ['user','event'])
     
     def computeTEUserEvents(self):
-        repoActorEventsTS = self.getTimeSeriesUsersEvents(self.main_df, self.repo_actors) 
 
+        #the rockstars are the top users of computeTEUsers unless top users were given to the Measurements object
         if len(self.top_users) == 0:
             self.computeTEUsers()
 
         repoRockstars = self.top_users
+
+        key = self.getTEResultKey('computeTEUserEvents', tuple((repo, tuple(x[0] for x in nodes)) for repo, nodes in sorted(repoRockstars.items())))
+        if key in self.te_results:
+            return self.te_results[key]
+
+        repoActorEventsTS = self.getTimeSeriesUsersEvents(self.main_df, self.repo_actors) 
+
 #         #Divide up the data into SRC (rockstars) and TAR (others) time series
         repoActorsSRC, repoActorsTAR = self.getSourceTargetUserEventTS(repoActorEventsTS,repoRockstars, self.starEvent, self.otherEvents)
 
@@ -320,8 +510,8 @@ class TEMeasurements():
         repoActorsSRCBinned = self.getBinnedBinaryTimeSeries(repoActorsSRC, self.binSize, totalBins)
         repoActorsTARBinned = self.getBinnedBinaryTimeSeries(repoActorsTAR, self.binSize, totalBins)
 
-        topEdges, topNodes = self.createAllTEMatrices(repoActorsSRCBinned, repoActorsTARBinned, self.teThresh[1], self.delayUnits, nReps = self.nReps, kE=self.kE, kN=self.kN) 
-        return topEdges, topNodes
+        self.te_results[key] = self.createAllTEMatrices(repoActorsSRCBinned, repoActorsTARBinned, self.teThresh[1], self.delayUnits, nReps = self.nReps, kE=self.kE, kN=self.kN) 
+        return self.te_results[key]
         
     
     '''
@@ -330,18 +520,18 @@ class TEMeasurements():
     '''
     def getTimeSeriesRepos(self):
   
-        timeseries = dict()
-        for desc,repos in self.repo_groups.iteritems():
-            tempdf = self.main_df[self.main_df['repo'].isin(repos)] #get only repos we care about
-            if (not tempdf.empty):
-                tempdf['time'] = pd.to_datetime(tempdf['time'])
-                tempdf['time'] = (tempdf['time'] - self.startTime).astype('timedelta64[s]')
-                tempDic = tempdf[['repo','time']].groupby('repo')['time'].apply(list).to_dict()
-                timeseries[desc] = tempDic
-
-        return timeseries    
+        groups = list(self.repo_groups.items())
+        repos = [repo for desc, repos in groups for repo in repos]
+        df = self.main_df[self.main_df['repo'].isin(self.encode('repo', repos))] #get only repos we care about
+
+        return self.getGroupSeries(df, groups, ['repo'])
     
     def computeTERepos(self):
+
+        key = self.getTEResultKey('computeTERepos')
+        if key in self.te_results:
+            return self.te_results[key]
+
         print("Getting time series from CSV data file.")
         repoTS = self.getTimeSeriesRepos()
 
@@ -350,5 +540,5 @@ class TEMeasurements():
         totalBins = int(np.ceil(maxT/float(self.binSize)))
         reposBinned = self.getBinnedBinaryTimeSeries(repoTS, self.binSize, totalBins)    
 
-        topEdges, topNodes = self.createAllTEMatrices(reposBinned, reposBinned, self.teThresh[2], self.delayUnits, nReps = self.nReps, kE = self.kE, kN = self.kN) 
-        return topEdges, topNodes
+        self.te_results[key] = self.createAllTEMatrices(reposBinned, reposBinned, self.teThresh[2], self.delayUnits, nReps = self.nReps, kE = self.kE, kN = self.kN) 
+        return self.te_results[key]
@@ -3,7 +3,7 @@ import numpy as np
 from datetime import datetime
 from multiprocessing import Pool
 from functools import partial
-from pathos import pools as pp
+from GroupIndex import meanInterEventTime
 
 '''
 This class implements user centric method. Each function will describe which metric it is used for according
@@ -29,12 +29,12 @@ class UserCentricMeasurements(object):
             #self.selectedUsers is a data frame containing only the users in interested_users
             df = self.selectedUsers
         elif users != False:
-            df = df[df.user.isin(users)]
+            df = self.main_df[self.main_df.user.isin(self.encode('user', users))]
         else:
             df = self.main_df
 
         if eventType != None:
-            df = df[df.event.isin(eventType)]
+            df = df[df.event.isin(self.encode('event', eventType))]
 
         return df
 
@@ -50,7 +50,7 @@ class UserCentricMeasurements(object):
         df = df.groupby('user')
         data = df.repo.nunique().reset_index()
         data.columns = ['user','value']
-        return data
+        return self.decodeResult(data)
 
     '''
     This method returns the timeline of activity of the desired user over time, either in raw or cumulative counts.
@@ -64,6 +64,7 @@ class UserCentricMeasurements(object):
     def getUserActivityTimeline(self, selectedUsers=True,time_bin='1d',cumSum=False,eventType=None):
         df = self.determineDf(selectedUsers,eventType)
 
+        df = df[['user','time']]
         df['value'] = 1
         if cumSum:
             df['cumsum'] = df.groupby('user').value.transform(pd.Series.cumsum)
@@ -76,7 +77,7 @@ class UserCentricMeasurements(object):
         data = df.sort_values(['user', 'time'])
         measurements = {}
         for user in data['user'].unique():
-            measurements[user] = data[data['user'] == user]
+            measurements[self.decodeValue('user', user)] = self.decodeResult(data[data['user'] == user])
 
         return measurements
 
@@ -99,18 +100,22 @@ class UserCentricMeasurements(object):
 
         repo_popularity = df.groupby('repo')['value'].sum().reset_index()
 
+        if not use_metadata:
+            #owner ids are taken from the repo id strings or the user ids of creation events
+            repo_popularity = self.decode(repo_popularity)
+
         if use_metadata:
             #merge repo popularity with the owner information in repo_metadata
             #drop data for which no owner information exists in metadata
             merged = repo_popularity.merge(self.repoMetaData,left_on='repo',right_on='full_name_h',
                                            how='left').dropna()
-        elif df['repo'].str.match('.{22}/.{22}').all():
+        elif repo_popularity['repo'].str.match('.{22}/.{22}').all():
             #if all repo IDs have the correct format use the owner info from the repo id
             repo_popularity['owner_id'] = repo_popularity['repo'].apply(lambda x: x.split('/')[0])
         else:
             #otherwise use creation event as a proxy for ownership
-            user_repos = df[df['event'] == 'CreateEvent'].sort_values('time').drop_duplicates(subset='repo',keep='first')
-            user_repos = user_repos[['user','repo']]
+            user_repos = df[df['event'] == self.encode('event', 'CreateEvent')].sort_values('time').drop_duplicates(subset='repo',keep='first')
+            user_repos = self.decode(user_repos[['user','repo']])
             user_repos.columns = ['owner_id','repo']
             if len(user_repos.index) >= 0:
                 repo_popularity = user_repos.merge(repo_popularity,on='repo',how='left')
@@ -124,34 +129,17 @@ class UserCentricMeasurements(object):
 
     '''
     This method returns the average time between events for each user
+    The averages of all users are computed in one pass (see meanInterEventTime in GroupIndex.py).
 
-    Inputs: df - Data frame of all data for repos
-    users - (Optional) List of specific users to calculate the metric for
-    nCPu - (Optional) Number of CPU's to run metric in parallel
-    Outputs: A list of average times for each user. Length should match number of repos
-    '''
-    def getAvgTimebwEventsUsers(self,selectedUsers=True, nCPU=1):
-        df = self.determineDf(selectedUsers)
-        users = self.df['user'].unique()
-        args = [(df, users[i]) for i, item_a in enumerate(users)]
-        pool = pp.ProcessPool(nCPU)
-        deltas = pool.map(self.getMeanTimeHelper, args)
-        return deltas
-
-    '''
-    Helper function for getting the average time between events
-
-    Inputs: Same as average time between events
-    Output: Same as average time between events
+    Inputs: selectedUsers - A list of users of interest or a boolean indicating whether to subset to node-level measurement users.
+            eventType - A list of event types to include in the data
+            unit - (Optional) Time unit of the averages, check np.timedelta64 documentation for the possible options
+    Outputs: A series of average times indexed by user. Elements with NaN correspond to a user only having a single event.
     '''
-    def getMeanTimeUser(self,df, user):
-        d = df[df.user == user]
-        d = d.sort_values(by='time')
-        delta = np.mean(np.diff(d.time)) / np.timedelta64(1, 's')
-        return delta
-
-    def getMeanTimeUserHelper(self,args):
-        return self.getMeanTimeUser(*args)
+    def getAvgTimebwEventsUsers(self,selectedUsers=True,eventType=None,unit='s'):
+        df = self.determineDf(selectedUsers,eventType)
+        deltas = meanInterEventTime(df, 'user', unit=unit)
+        return self.decodeResult(deltas)
 
     '''
     This method returns distribution the diffusion delay for each user
@@ -192,13 +180,13 @@ class UserCentricMeasurements(object):
         df = self.main_df
 
         if eventType != None:
-            df = df[df.event.isin(eventType)]
+            df = df[df.event.isin(self.encode('event', eventType))]
 
         df['value'] = 1
         df = df.groupby('user')
-        measurement = df.value.sum().sort_values(ascending=False).head(k)
+        measurement = self.sortIds(df.value.sum()).sort_values(ascending=False).head(k)
         measurement = pd.DataFrame(measurement).sort_values('value',ascending=False)
-        return measurement
+        return self.decodeResult(measurement)
 
     '''
     This method returns the distribution for the users activity (event counts).
@@ -215,12 +203,12 @@ class UserCentricMeasurements(object):
             df = self.main_df
 
         if eventType != None:
-            df = df[df.event.isin(eventType)]
+            df = df[df.event.isin(self.encode('event', eventType))]
 
         df['value'] = 1
         df = df.groupby('user')
         measurement = df.value.sum().reset_index()
-        return measurement
+        return self.decodeResult(measurement)
 
 
     '''
@@ -234,9 +222,9 @@ class UserCentricMeasurements(object):
 
         df = self.main_df_opt
 
-        if not df is None and 'PullRequestEvent' in self.main_df.event.values:
-            df = df[self.main_df.event.isin(eventType)]
-            users_repos = self.main_df[self.main_df.event.isin(eventType)]
+        if not df is None and self.encode('event', 'PullRequestEvent') in self.main_df.event.values:
+            df = df[self.main_df.event.isin(self.encode('event', eventType))]
+            users_repos = self.main_df[self.main_df.event.isin(self.encode('event', eventType))]
 
             #subset on only PullRequest close actions (not opens)
             idx = df['action'] == 'closed'
@@ -245,7 +233,7 @@ class UserCentricMeasurements(object):
 
             #merge pull request columns (action, merged) with main data frame columns
             closes = pd.concat([users_repos,closes],axis=1)
-            closes = closes[['user','repo','merged']]
+            closes = self.decode(closes[['user','repo','merged']])
             closes['value'] = 1
 
             #add up number of accepted (merged) and rejected pullrequests by user and repo
@@ -483,7 +483,7 @@ def run_metrics(ground_truth, simulation, measurement_name,measurement_on_gt=Non
     Run all of the assigned metrics for a given measurement.
 
     Inputs:
-    ground_truth - Measurements object of ground truth data
+    ground_truth - Measurements object of ground truth data or a dictionary of pre-calculated ground truth measurement outputs keyed by measurement name
     simulation - Measurements object of simulated data
     measurement_name - Name of measurement corresponding to keys of measurement_params
 
@@ -504,7 +504,9 @@ def run_metrics(ground_truth, simulation, measurement_name,measurement_on_gt=Non
     metrics_output = {}
 
     #ground_truth measurement
-    if measurement_on_gt is None:
+    if measurement_on_gt is None and isinstance(ground_truth, dict):
+        measurement_on_gt = ground_truth[measurement_name]
+    elif measurement_on_gt is None:
         measurement_function = getattr(ground_truth,p['measurement'])
         print("Measuring {} for ground truth data".format(measurement_function.__name__))
         measurement_on_gt = measurement_function(**measurement_args)
@@ -2,13 +2,18 @@ import pandas as pd
 from functools import partial, update_wrapper
 import Metrics
 from Measurements import *
+from EventStore import Vocabulary
+from MeasurementCache import MeasurementCache, datasetFingerprint
 
 import math
 import json
 import argparse
 import numpy as np
 from time import time
+from multiprocessing import cpu_count
+from pathos import pools as pp
 import pprint
+from collections import defaultdict
 
 def named_partial(func, *args, **kwargs):
     partial_func = partial(func, *args, **kwargs)
@@ -486,16 +491,18 @@ measurement_params.update(community_measurement_params)
 measurement_params.update(te_measurement_params)
 
 
-def run_metrics(ground_truth, simulation, measurement_name,measurement_on_gt=None):
+def run_metrics(ground_truth, simulation, measurement_name,measurement_on_gt=None,cache=None):
 
 
     """
     Run all of the assigned metrics for a given measurement.
 
     Inputs:
-    ground_truth - Measurements object of ground truth data
+    ground_truth - Measurements object of ground truth data or a dictionary of pre-calculated ground truth measurement outputs keyed by measurement name
     simulation - Measurements object of simulated data
     measurement_name - Name of measurement corresponding to keys of measurement_params
+    measurement_on_gt - (Optional) Pre-calculated output of the measurement for the ground truth data
+    cache - (Optional) MeasurementCache of the ground truth data.  Ground truth outputs are loaded from the cache if present and stored in it otherwise.
 
     Outputs:
     measurement_on_gt - Output of the measurement for the ground truth data
@@ -513,7 +520,15 @@ def run_metrics(ground_truth, simulation, measurement_name,measurement_on_gt=Non
     metrics_output = {}
 
     #ground_truth measurement
-    if measurement_on_gt is None:
+    if measurement_on_gt is None and isinstance(ground_truth, dict):
+        measurement_on_gt = ground_truth[measurement_name]
+    elif measurement_on_gt is None and cache is not None and cache.contains(measurement_name, measurement_args):
+        print("Loading {} for ground truth data from cache".format(p['measurement']))
+        measurement_on_gt = cache.load(measurement_name, measurement_args)
+        #restore the state other measurements take from this measurement
+        if p['measurement'] in measurement_restore:
+            getattr(ground_truth, measurement_restore[p['measurement']])(measurement_on_gt)
+    elif measurement_on_gt is None:
         pprint.pprint(ground_truth)
         measurement_function = getattr(ground_truth,p['measurement'])
         print("Measuring {} for ground truth data".format(measurement_function.__name__))
@@ -522,6 +537,8 @@ def run_metrics(ground_truth, simulation, measurement_name,measurement_on_gt=Non
             measurement_on_gt = measurement_on_gt
         print (measurement_function.__name__)
         print (measurement_on_gt)
+        if cache is not None:
+            cache.save(measurement_name, measurement_args, measurement_on_gt)
 
     #simulation measurement
     measurement_function = getattr(simulation,p['measurement'])
@@ -534,25 +551,32 @@ def run_metrics(ground_truth, simulation, measurement_name,measurement_on_gt=Non
     metrics = p['metrics']
 
     if p["scale"] in ["node","community"]:
+
+        #metrics with a node-level version are calculated for all nodes at once on the stacked node outputs
+        nodes = [node for node in measurement_on_gt if node in measurement_on_sim and
+                 not measurement_on_gt[node] is None and not measurement_on_sim[node] is None]
+        node_results = run_node_metrics(measurement_on_gt, measurement_on_sim, nodes, metrics)
+
+        #iterate over individual nodes and communities to calculate the metric results for each.
+        #the distributional metrics of a node share one DistributionComparison of the node outputs
         for node in measurement_on_gt:
             metrics_output[node] = {}
+            print(node)
 
+            if node in measurement_on_sim:
+                comparison = Metrics.DistributionComparison(measurement_on_gt[node], measurement_on_sim[node])
 
-    #iterate over the metrics assigned to the measurement
-    for m, metric_function in metrics.items():
-        print("Calculating {} for {}".format(metric_function.__name__, measurement_function.__name__))
-        start_time = time()
-        if p["scale"] in ["node","community"]:
-
-            #iterate over individual nodes and communities to calculate the metric results for each
-            for node in measurement_on_gt:
+            for m, metric_function in metrics.items():
+                print("Calculating {} for {}".format(metric_function.__name__, measurement_function.__name__))
                 start_time = time()
-                print(node)
 
                 if node in measurement_on_gt and node in measurement_on_sim:
                     print(measurement_on_gt[node])
                     if not measurement_on_gt[node] is None and not measurement_on_sim[node] is None:
-                        metric = metric_function(measurement_on_gt[node],measurement_on_sim[node])
+                        if m in node_results:
+                            metric = node_results[m].get(node)
+                        else:
+                            metric = call_metric(metric_function, measurement_on_gt[node], measurement_on_sim[node], comparison)
                     else:
                         metric=None
                 else:
@@ -561,9 +585,17 @@ def run_metrics(ground_truth, simulation, measurement_name,measurement_on_gt=Non
                 end_time = time()
                 metrics_output[node][m] = metric
                 metrics_output[node]['eta'] = pretty_time(end_time-start_time)
-        else:
+
+    else:
+
+        comparison = Metrics.DistributionComparison(measurement_on_gt, measurement_on_sim)
+
+        #iterate over the metrics assigned to the measurement
+        for m, metric_function in metrics.items():
+            print("Calculating {} for {}".format(metric_function.__name__, measurement_function.__name__))
+            start_time = time()
             end_time = time()
-            metric = metric_function(measurement_on_gt, measurement_on_sim)
+            metric = call_metric(metric_function, measurement_on_gt, measurement_on_sim, comparison)
             metrics_output[m] = metric
             metrics_output['eta'] = pretty_time(end_time-start_time)
 
@@ -575,7 +607,98 @@ def run_metrics(ground_truth, simulation, measurement_name,measurement_on_gt=Non
 
 
 
-def run_all_metrics(ground_truth, simulation, scale=None, node_type = None):
+def call_metric(metric_function, ground_truth, simulation, comparison):
+    """
+    Run a metric on a ground truth and simulation measurement pair
+
+    Inputs:
+    metric_function - Metric function
+    ground_truth - Ground truth measurement output
+    simulation - Simulation measurement output
+    comparison - DistributionComparison of the pair, passed to the distributional metrics (see Metrics.is_distribution_metric)
+    """
+
+    if Metrics.is_distribution_metric(metric_function):
+        return metric_function(ground_truth, simulation, comparison=comparison)
+
+    return metric_function(ground_truth, simulation)
+
+
+def run_node_metrics(measurement_on_gt, measurement_on_sim, nodes, metrics):
+    """
+    Calculate the metrics which have a node-level version (see Metrics.get_node_metric) for all nodes at once.
+
+    Inputs:
+    measurement_on_gt - Dictionary of the ground truth measurement outputs keyed by node
+    measurement_on_sim - Dictionary of the simulation measurement outputs keyed by node
+    nodes - Nodes with outputs for both the ground truth and simulation data
+    metrics - Dictionary of metric functions keyed by metric name
+
+    Outputs:
+    Dictionary of node to metric result dictionaries keyed by metric name.  Metrics without a node-level version
+    and measurements whose node outputs cannot be stacked into one data frame are left out.
+    """
+
+    node_results = {}
+
+    if len(nodes) == 0 or all(Metrics.get_node_metric(metric_function) is None for metric_function in metrics.values()):
+        return node_results
+
+    gt = Metrics.stack_nodes(measurement_on_gt, nodes)
+    sim = Metrics.stack_nodes(measurement_on_sim, nodes)
+    if gt is None or sim is None or list(gt.columns) != list(sim.columns):
+        return node_results
+
+    #node outputs with key columns besides the node and value can be joined
+    joined = len(gt.columns) > 2
+
+    for m, metric_function in metrics.items():
+        node_metric = Metrics.get_node_metric(metric_function, joined=joined)
+        if node_metric is None:
+            continue
+
+        print("Calculating {} for {} nodes".format(m, len(nodes)))
+        start_time = time()
+        results = node_metric(gt, sim)
+        node_results[m] = {nodes[i]: result for i, result in results.items()}
+        print("Calculated {} in {}".format(m, pretty_time(time() - start_time)))
+
+    return node_results
+
+
+#inputs of the measurements run by the worker processes of run_all_metrics.  They are set before the
+#workers are forked, so the workers inherit the preprocessed data instead of receiving a pickled copy.
+_worker_inputs = {}
+
+#lazy Measurements attributes used by the measurements of each scale.  In parallel mode they are built
+#once before forking rather than once per worker.
+scale_attributes = {"node": ["selectedRepos", "selectedUsers"],
+                    "community": ["communities"],
+                    "te": ["repo_actors", "repo_groups"]}
+
+
+#measurements which reuse the results of another measurement function (see TEMeasurements.py)
+measurement_dependencies = {"computeTEUserEvents": "computeTEUsers"}
+
+#methods restoring the state set by a measurement function (used by its dependent measurements)
+#from its output when the output is loaded from the cache instead of computed
+measurement_restore = {"computeTEUsers": "restoreTEUsers"}
+
+
+def _run_worker_metrics(measurement_names):
+    """
+    Run the metrics of a list of measurements on the inputs inherited from run_all_metrics.
+    Only the metric results are sent back to the parent process.
+    """
+    metric_results = []
+    for measurement_name in measurement_names:
+        gt, sim, measurement_results = run_metrics(_worker_inputs["ground_truth"], _worker_inputs["simulation"],
+                                                   measurement_name, cache=_worker_inputs["cache"])
+        metric_results.append(measurement_results)
+    return metric_results
+
+
+def run_all_metrics(ground_truth, simulation, scale=None, node_type = None, cache=None, nCPU=1):
 
     """
     Calculate metrics for multiple measurements.
@@ -585,6 +708,8 @@ def run_all_metrics(ground_truth, simulation, scale=None, node_type = None):
     simulation - Simulation Meausrements object
     scale = Select measurements of a particular scale, possible values are currently "node" or "population".  If None, measurements of all scales are included.
     node_type = Select measurements of particular node-type, possible values are "repo" or "user".  If None, measurements of both node types are included.
+    cache = (Optional) MeasurementCache of the ground truth data, see run_metrics.
+    nCPU = (Optional) Number of worker processes running measurements in parallel.  If None, all cores are used.  Results do not depend on the number of workers.
     """
     def without_keys(d, keys):
         """
@@ -597,9 +722,47 @@ def run_all_metrics(ground_truth, simulation, scale=None, node_type = None):
     #select measurements of desired scale and node type
     measurements = [m for m, m_info in measurement_params.items() if (scale is None or m_info["scale"] == scale) and (node_type is None or m_info["node_type"] == node_type)]
 
-    for measurement_name in measurements:
-        gt, sim, metric_results = run_metrics(ground_truth, simulation, measurement_name)
-        results[measurement_name] = metric_results
+    if nCPU is None:
+        nCPU = cpu_count()
+
+    if nCPU > 1 and len(measurements) > 1:
+        for data in [ground_truth, simulation]:
+            if isinstance(data, dict):
+                continue
+            for m_scale in set(measurement_params[m]["scale"] for m in measurements):
+                for attribute in scale_attributes.get(m_scale, []):
+                    getattr(data, attribute)
+
+        #measurements computed by the same function (and those reusing its results) run in one task so that
+        #results stored on the Measurements objects, such as the TE results, are shared between them
+        tasks = defaultdict(list)
+        for measurement_name in measurements:
+            p = measurement_params[measurement_name]
+            function = measurement_dependencies.get(p["measurement"], p["measurement"])
+            tasks[(function, repr(sorted(p.get("measurement_args", {}).items())))].append(measurement_name)
+        tasks = list(tasks.values())
+
+        _worker_inputs.update(ground_truth=ground_truth, simulation=simulation, cache=cache)
+        try:
+            pool = pp.ProcessPool(nCPU)
+            #drop any cached workers forked before the inputs were set
+            pool.clear()
+            #map returns the results in the order of tasks, whatever order the workers finish in
+            task_results = pool.map(_run_worker_metrics, tasks)
+            pool.close()
+            pool.join()
+            pool.clear()
+        finally:
+            _worker_inputs.clear()
+
+        task_results = dict((name, result) for names, results in zip(tasks, task_results) for name, result in zip(names, results))
+        metric_results = [task_results[measurement_name] for measurement_name in measurements]
+    else:
+        metric_results = [run_metrics(ground_truth, simulation, measurement_name, cache=cache)[2]
+                          for measurement_name in measurements]
+
+    for measurement_name, measurement_results in zip(measurements, metric_results):
+        results[measurement_name] = measurement_results
         results[measurement_name]["metadata"] = without_keys(measurement_params[measurement_name], ["measurement"])
     end_time = time()
     results["eta"] = pretty_time(end_time-start_time)
@@ -625,13 +788,17 @@ class EvaluationEngine:
     """
     Engine loading groundtruth and predicted events, processing all metrics evaluations.
     """
-    def __init__(self, gt_file, sim_file):
+    def __init__(self, gt_file, sim_file, cache_dir='measurement_cache', nCPU=None):
         """
         Load event files
         Data should be in 4-column format: time, event, user, repo
         @param sim_file:  predicted event file in .csv format
         @param gt_file: ground_truth event file in .csv format
+        @param cache_dir: directory of the ground truth measurement cache (None to disable caching)
+        @param nCPU: number of measurements run in parallel (None to use all cores)
         """
+        self.cache = None
+        self.nCPU = nCPU
         if not gt_file or not sim_file:
             self.simulation = self.ground_truth = {}
             return
@@ -645,15 +812,32 @@ class EvaluationEngine:
         repo_ids = ['sG2sD5eAH3ojlZYCsX3hJg/sG2sD5eAH3ojlZYCsX3hJg','DXUQl8d5BBrhwGo5eU5d5Q/iS-SlfdKFS3N_iSpaYLX3Q',
                     'x9BrCoUrzYi11O-5Y-tFzg/2c9v3EnK2YrZcVgb0shFyQ','2-scMrZv13F95YPZmfieww/1EaArWHXzf8AhyhA34CX6w']
 
-        self.simulation = Measurements(pd.read_csv(sim_file,
-                                      names=["time","event","user","repo"]),
-                                       interested_users=user_ids,
-                                       interested_repos=repo_ids)
+        #both data sets are encoded with one vocabulary so that user and repo codes agree between
+        #the measurement outputs and the metrics can align them on integer keys
+        vocab = Vocabulary()
 
         self.ground_truth = Measurements(pd.read_csv(gt_file,
                                         names=["time","event","user","repo"]),
                                          interested_users=user_ids,
-                                         interested_repos=repo_ids)
+                                         interested_repos=repo_ids,
+                                         vocabulary=vocab,
+                                         decodeResults=False)
+
+        self.simulation = Measurements(pd.read_csv(sim_file,
+                                      names=["time","event","user","repo"]),
+                                       interested_users=user_ids,
+                                       interested_repos=repo_ids,
+                                       vocabulary=vocab,
+                                       decodeResults=False)
+
+        if cache_dir:
+            #ground truth outputs depend on the events file, the node and community definitions and the
+            #selected nodes.  Codes in the outputs only depend on the ground truth, which is encoded first.
+            gt = self.ground_truth
+            fingerprint = datasetFingerprint([gt_file, gt.communitiesFile, gt.repoActorsFile, gt.reposFile, gt.previousActionsFile],
+                                             options=(user_ids, repo_ids, gt.decodeResults))
+            self.cache = MeasurementCache(cache_dir, fingerprint)
+
         print ("Elapsed time: " + pretty_time(time() - start_time))
 
     def evaluate (self, json_output_file):
@@ -666,7 +850,7 @@ class EvaluationEngine:
         # gt_measurement, sim_measurement, metrics = run_metrics(self.ground_truth, self.simulation, "repo_contributors")
 
         # Run all metrics
-        metrics = run_all_metrics(self.ground_truth, self.simulation)
+        metrics = run_all_metrics(self.ground_truth, self.simulation, cache=self.cache, nCPU=self.nCPU)
 
         # Print and save results to output json file
         res = json.dumps(json_convert(metrics), indent=2, sort_keys=True)
@@ -686,12 +870,18 @@ def main():
                         help='path to the .csv file containing the events to use as ground_truth')
     parser.add_argument('-o', '--output_json_file', dest='json_output_file', default='eval_output.json',
                         help='path to the .json output file to store evaluation results')
+    parser.add_argument('-c', '--cache_dir', dest='cache_dir', default='measurement_cache',
+                        help='directory for caching the ground truth measurements between evaluations')
+    parser.add_argument('--no_cache', dest='cache_dir', action='store_const', const=None,
+                        help='always recompute the ground truth measurements')
+    parser.add_argument('-n', '--nCPU', dest='nCPU', type=int, default=None,
+                        help='number of measurements to run in parallel (default: all cores)')
 
 
     args = parser.parse_args()
 
     if args.sim and args.gt:
-        engine = EvaluationEngine(args.gt, args.sim)
+        engine = EvaluationEngine(args.gt, args.sim, cache_dir=args.cache_dir, nCPU=args.nCPU)
         engine.evaluate(args.json_output_file)
     else:
         print (parser.print_help())
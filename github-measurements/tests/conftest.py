@@ -0,0 +1,5 @@
+import os
+import sys
+
+#the measurement modules are imported from the github-measurements directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
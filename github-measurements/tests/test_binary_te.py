@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+from BinaryTE import jointStateCounts, pairSeed, teZScores, teZScoresSequential
+
+
+def synthetic_counts(nPairs, n=200, seed=0):
+    """
+    Joint state counts of random pairs ranging from independent to strongly coupled series
+    """
+
+    rng = np.random.RandomState(seed)
+    counts = []
+    for i in range(nPairs):
+        src = (rng.rand(n) < rng.uniform(0.05, 0.5)).astype(int)
+        coupled = rng.rand(n) < rng.uniform(0.0, 0.5)
+        dest = np.where(coupled, np.roll(src, 1), rng.rand(n) < rng.uniform(0.05, 0.5)).astype(int)
+        counts.append(jointStateCounts(src, dest, 1))
+
+    return np.array(counts)
+
+
+def test_sequential_decisions_agree_with_full_surrogates():
+
+    counts = synthetic_counts(600)
+    nReps = 100
+
+    full = teZScores(counts, nReps, np.random.RandomState(1)) >= 3.0
+    fullRepeat = teZScores(counts, nReps, np.random.RandomState(2)) >= 3.0
+    z_scores, used = teZScoresSequential(counts, nReps, np.random.RandomState(3))
+    sequential = z_scores >= 3.0
+
+    stopped = used < nReps
+    assert stopped.sum() > 0.1 * len(counts)
+
+    #pairs stopped early are settled as not significant, and at most 1% of the pairs
+    #are stopped although the full test finds them significant
+    assert not sequential[stopped].any()
+    assert (stopped & full).sum() <= 0.01 * len(counts)
+
+    #overall the sequential decisions differ from the full test at most as much as
+    #a repeat of the full test with other surrogates (plus 1% of the pairs)
+    assert (sequential != full).sum() <= (fullRepeat != full).sum() + 0.01 * len(counts)
+
+
+def test_sequential_uses_all_surrogates_for_significant_pairs():
+
+    counts = synthetic_counts(200, seed=4)
+    z_scores, used = teZScoresSequential(counts, 100, np.random.RandomState(5))
+
+    assert (used[z_scores >= 3.0] == 100).all()
+    assert (used >= 30).all()
+
+
+def test_pair_significance_is_reproducible():
+
+    from TEMeasurements import TEMeasurements
+
+    rng = np.random.RandomState(6)
+    src = (rng.rand(300) < 0.3).astype(int)
+    dest = np.where(rng.rand(300) < 0.4, np.roll(src, 1), rng.rand(300) < 0.3).astype(int)
+
+    measurements = TEMeasurements.__new__(TEMeasurements)
+    measurements.teSeed = 0
+    te = [measurements.getTETimeSeriesPairBinaryNumpy(src, dest, 0.0, 1, 100) for i in range(2)]
+
+    assert te[0] > 0.0
+    assert te[0] == te[1]
+    assert pairSeed(0, src, dest, 1) != pairSeed(0, dest, src, 1)
+
+
+def test_group_series_order_of_encoded_ids():
+
+    from EventStore import Vocabulary
+    from Measurements import Measurements
+
+    #ids added to the vocabulary out of their sorted order
+    df = pd.DataFrame({'user': ['u3', 'u1', 'u2', 'u3', 'u1'], 'event': ['Push'] * 5,
+                       'time': pd.date_range('2017-01-01', periods=5, freq='h')})
+    groups = [('r1', ['u2', 'u3', 'u1'])]
+
+    series = []
+    for vocab in [None, Vocabulary()]:
+        measurements = Measurements.__new__(Measurements)
+        measurements.vocab = vocab
+        measurements.startTime = df['time'].min()
+        events = df.copy()
+        if vocab is not None:
+            events['user'] = vocab.update('user', events['user'])
+        series.append(measurements.getGroupSeries(events, groups, ['user']))
+
+    assert series[0].keys() == [('r1', 'u1'), ('r1', 'u2'), ('r1', 'u3')]
+    assert series[1].keys() == series[0].keys()
+    assert all(list(series[0][i]) == list(series[1][i]) for i in range(len(series[0])))
+
+
+def test_prune_stats_count_pairs_left_out():
+
+    from TEMeasurements import TEMeasurements
+
+    rng = np.random.RandomState(7)
+    series = dict(('u{}'.format(i), (rng.rand(200) < 0.3).astype(np.int8)) for i in range(3))
+    series['quiet'] = np.zeros(200, dtype=np.int8)
+
+    measurements = TEMeasurements.__new__(TEMeasurements)
+    measurements.teSeed = 0
+    measurements.teSequential = False
+    measurements.te_surrogates = {}
+    measurements.te_prune_stats = {}
+    measurements.getTESigMatrixNumpy(series, series, 0.01, [1], 20, group='r')
+
+    #the constant series is dropped as a source and as a destination, which leaves out its 6 pairs
+    assert measurements.te_prune_stats['r'] == {'pairs': 12, 'pruned pairs': 6,
+                                                'pruned sources': 1, 'pruned destinations': 1}
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from EventStore import Vocabulary, preprocessEvents, readEventStore, writeEventStore
+
+
+def events():
+    """
+    Raw 6-column event data frame with repeated ids, missing merged flags and unsorted times
+    """
+
+    return pd.DataFrame({'created_at': ['2017-08-03 10:00:00', '2017-08-01 09:30:00', '2017-08-02 12:00:00',
+                                        '2017-08-01 09:30:00'],
+                         'type': ['PushEvent', 'IssuesEvent', 'PullRequestEvent', 'PushEvent'],
+                         'actor': ['alice', 'bob', 'alice', 'carol'],
+                         'repo': ['x/a', 'y/b', 'x/a', 'z/c'],
+                         'action': ['', 'opened', 'closed', ''],
+                         'merged': [np.nan, np.nan, True, np.nan]})
+
+
+def test_event_store_round_trip(tmp_path):
+
+    df = preprocessEvents(events())
+    writeEventStore(df, str(tmp_path))
+
+    for mmap in [True, False]:
+        store = readEventStore(str(tmp_path), mmap=mmap)
+
+        assert list(store['time']) == list(df['time'])
+        for col in ['event', 'user', 'repo', 'action']:
+            assert list(store[col]) == list(df[col])
+        assert [m is True for m in store['merged']] == [m is True for m in df['merged']]
+
+
+def test_event_store_codes_of_vocabulary(tmp_path):
+
+    df = preprocessEvents(events())
+    writeEventStore(df, str(tmp_path))
+
+    vocabulary = Vocabulary()
+    store = readEventStore(str(tmp_path), vocabulary=vocabulary)
+
+    assert list(vocabulary.decode('user', store['user'].values)) == list(df['user'])
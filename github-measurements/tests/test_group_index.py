@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from GroupIndex import GroupIndex, MembershipIndex
+
+
+def test_group_index_missing_and_repeated_keys():
+
+    #repo codes with a missing (-1) repo in the events
+    df = pd.DataFrame({'repo': np.array([0, 1, -1, 0, 2, 1], dtype=np.int32), 'value': np.arange(6)})
+
+    #two repos missing from the vocabulary (code -1) and a repeated repo
+    index = GroupIndex(df, 'repo', [1, -1, 0, -1, 1], labels=['b', 'gone1', 'a', 'gone2', 'b'], missing=-1)
+
+    assert index.keys() == ['b', 'gone1', 'a', 'gone2']
+    assert list(index['b']['value']) == [1, 5]
+    assert list(index['a']['value']) == [0, 3]
+    assert len(index['gone1'].index) == 0
+    assert len(index['gone2'].index) == 0
+    assert index.sizes() == {'b': 2, 'gone1': 0, 'a': 2, 'gone2': 0}
+
+
+def test_group_index_null_keys_match_no_events():
+
+    df = pd.DataFrame({'repo': ['x', None, 'y', np.nan], 'value': np.arange(4)})
+    index = GroupIndex(df, 'repo', ['y', None, 'x'])
+
+    assert list(index['x']['value']) == [0]
+    assert list(index['y']['value']) == [2]
+    assert len(index[None].index) == 0
+
+
+def test_membership_index_missing_members():
+
+    df = pd.DataFrame({'repo': np.array([0, -1, 1, 2], dtype=np.int32), 'value': np.arange(4)})
+    index = MembershipIndex(df, [('c1', 'repo', [0, -1]), ('c2', 'repo', [-1]), ('c3', 'repo', [1, 2])], missing=-1)
+
+    assert list(index['c1']['value']) == [0]
+    assert len(index['c2'].index) == 0
+    assert list(index['c3']['value']) == [2, 3]
@@ -0,0 +1,43 @@
+import metrics_config_ui
+from MeasurementCache import MeasurementCache, codeFingerprint
+
+
+def test_cache_keys_depend_on_code_version(tmp_path):
+
+    cache = MeasurementCache(str(tmp_path), 'data')
+    cache.save('user_total', {'k': 1}, 42)
+
+    assert cache.version == codeFingerprint()
+    assert MeasurementCache(str(tmp_path), 'data').load('user_total', {'k': 1}) == 42
+    assert not MeasurementCache(str(tmp_path), 'data', version='other code').contains('user_total', {'k': 1})
+    assert not MeasurementCache(str(tmp_path), 'other data').contains('user_total', {'k': 1})
+
+
+class TEUsers(object):
+    """
+    Stand-in for the TE measurements of a Measurements object
+    """
+
+    def __init__(self):
+        self.top_users = {}
+        self.computed = 0
+
+    def computeTEUsers(self):
+        self.computed += 1
+        self.top_users = {'repo': [('alice', 0.5)]}
+        return ([(('alice', 'bob'), 0.5)], self.top_users)
+
+    def restoreTEUsers(self, result):
+        self.top_users = result[1]
+
+
+def test_cached_te_users_restore_top_users(tmp_path):
+
+    cache = MeasurementCache(str(tmp_path), 'data')
+    metrics_config_ui.run_metrics(TEUsers(), TEUsers(), 'user_total', cache=cache)
+
+    ground_truth = TEUsers()
+    metrics_config_ui.run_metrics(ground_truth, TEUsers(), 'user_total', cache=cache)
+
+    assert ground_truth.computed == 0
+    assert ground_truth.top_users == {'repo': [('alice', 0.5)]}
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+import Metrics
+
+
+def node_timelines(nNodes, seed):
+    """
+    Daily timelines of random nodes covering random subsets of 20 days
+    """
+
+    rng = np.random.RandomState(seed)
+    days = pd.date_range('2018-01-01', periods=20)
+    timelines = {}
+    for i in range(nNodes):
+        selected = np.sort(rng.choice(20, rng.randint(3, 20), replace=False))
+        timelines['node{}'.format(i)] = pd.DataFrame({'time': days[selected],
+                                                      'value': rng.poisson(2, len(selected)).astype(float)})
+
+    return timelines
+
+
+def test_node_pearson_matches_pearson():
+
+    ground_truth = node_timelines(40, 0)
+    simulation = node_timelines(40, 1)
+
+    #a node with two joined values, whose p-value is 1
+    ground_truth['pair'] = pd.DataFrame({'time': pd.date_range('2018-01-01', periods=2), 'value': [1.0, 2.0]})
+    simulation['pair'] = pd.DataFrame({'time': pd.date_range('2018-01-01', periods=2), 'value': [3.0, 5.0]})
+
+    nodes = list(ground_truth)
+    results = Metrics.node_pearson(Metrics.stack_nodes(ground_truth, nodes), Metrics.stack_nodes(simulation, nodes),
+                                   join='outer')
+
+    for i, node in enumerate(nodes):
+        expected = tuple(Metrics.pearson(ground_truth[node], simulation[node], join='outer'))
+        np.testing.assert_allclose(results[i], expected, rtol=1e-9, atol=1e-12)
+
+    assert results[nodes.index('pair')] == (1.0, 1.0)
+
+
+def merged(ground_truth, simulation, join, fill_value=0):
+    """
+    join_dfs by a pandas merge, with outer joins sorted by the keys
+    """
+
+    on = [c for c in ground_truth.columns if c != 'value']
+
+    return ground_truth.merge(simulation, on=on, suffixes=('_gt','_sim'), how=join,
+                              sort=(join == 'outer')).fillna(fill_value).reset_index(drop=True)
+
+
+def test_join_fast_paths_match_merge():
+
+    rng = np.random.RandomState(2)
+    days = pd.date_range('2018-01-01', periods=60)
+
+    for i in range(50):
+        #regularly spaced simulation times and sorted ground truth times with gaps
+        start = rng.randint(0, 20)
+        gt_days = days[np.sort(rng.choice(60, rng.randint(1, 30), replace=False))]
+        sim_days = days[start:start + rng.randint(1, 30)]
+        ground_truth = pd.DataFrame({'time': gt_days, 'value': rng.rand(len(gt_days))})
+        simulation = pd.DataFrame({'time': sim_days, 'value': rng.rand(len(sim_days))})
+        assert Metrics.is_regular_time_key(ground_truth, simulation, ['time'])
+
+        #unique integer keys in any order
+        gt_codes = pd.DataFrame({'user': rng.choice(40, 15, replace=False), 'value': rng.rand(15)})
+        sim_codes = pd.DataFrame({'user': rng.choice(40, 15, replace=False), 'value': rng.rand(15)})
+        assert Metrics.is_unique_integer_key(gt_codes, sim_codes, ['user'])
+
+        for join in ['inner', 'outer', 'left', 'right']:
+            pd.testing.assert_frame_equal(Metrics.join_dfs(ground_truth, simulation, join=join),
+                                          merged(ground_truth, simulation, join), check_dtype=False)
+            pd.testing.assert_frame_equal(Metrics.join_dfs(gt_codes, sim_codes, join=join),
+                                          merged(gt_codes, sim_codes, join), check_dtype=False)
+
+        df = merged(ground_truth, simulation, 'outer', fill_value=0.0)
+        assert Metrics.dtw(ground_truth, simulation) == Metrics.dtw_distance(df['value_gt'].values, df['value_sim'].values)
+
+
+def test_rbo_extrapolated():
+
+    gt = ['a', 'b', 'c', 'd', 'e', 'f']
+    sim = ['b', 'a', 'x', 'c']
+
+    assert abs(Metrics.rbo_score(gt, gt, p=0.9, extrapolate=True) - 1.0) < 1e-12
+
+    #p = 0 only considers the first rank
+    assert Metrics.rbo_score(gt, sim, p=0.0, extrapolate=True) == 0.0
+    assert Metrics.rbo_score(gt, ['a', 'x'], p=0.0, extrapolate=True) == 1.0
+
+    #equation 32 of the paper
+    p, s, l = 0.9, 4, 6
+    x = [len(set(gt[:d]) & set(sim[:d])) for d in range(1, l + 1)]
+    expected = sum(x[d - 1] / d * p ** d for d in range(1, l + 1))
+    expected += sum(x[s - 1] * (d - s) / (s * d) * p ** d for d in range(s + 1, l + 1))
+    expected = expected * (1 - p) / p + ((x[l - 1] - x[s - 1]) / l + x[s - 1] / s) * p ** l
+
+    assert abs(Metrics.rbo_score(gt, sim, p=p, extrapolate=True) - expected) < 1e-12
+
+
+def test_distribution_metrics_share_comparison():
+
+    rng = np.random.RandomState(8)
+    gt = pd.DataFrame({'value': rng.exponential(size=200)})
+    sim = pd.DataFrame({'value': rng.exponential(1.5, size=150)})
+
+    comparison = Metrics.DistributionComparison(gt, sim)
+    shared = [Metrics.js_divergence(gt, sim, comparison=comparison),
+              Metrics.kl_divergence(gt, sim, comparison=comparison),
+              Metrics.ks_test(gt, sim, comparison=comparison)]
+
+    assert shared == [Metrics.js_divergence(gt, sim), Metrics.kl_divergence(gt, sim), Metrics.ks_test(gt, sim)]
+    assert 'doane' in comparison._histograms
+    assert Metrics.is_distribution_metric(Metrics.ks_test)
+    assert not Metrics.is_distribution_metric(Metrics.rmse)